@@ -0,0 +1,66 @@
+from __future__ import print_function
+
+# Compare the hitability models on training time, single shot latency and
+# accuracy, e.g.
+#
+#   python benchmark_hitability.py --models svc gbt reach --json hitability.json
+
+import argparse
+import json
+import time
+import numpy as np
+
+from sklearn.model_selection import train_test_split
+from util.features import hitable
+from util.hitability import HIT_PARAMS
+from util.hitability import make_hit_model
+from util.models import HIT_FEATURES
+from util.models import load_training_data
+
+
+def benchmark(name, X_train, X_test, y_train, y_test, repeats=200):
+    """
+    Fit one hitability model and time it.
+
+    output:
+        A dict of the model name, seconds to fit, mean seconds to predict a
+        single shot and the accuracy on the test set.
+    """
+    model = make_hit_model(name)
+    start = time.time()
+    model.fit(X_train, y_train)
+    fit_time = time.time() - start
+
+    row = X_test[:1]
+    model.predict(row)
+    start = time.time()
+    for _ in range(repeats):
+        model.predict(row)
+    latency = (time.time() - start) / repeats
+
+    accuracy = float(np.mean(model.predict(X_test) == y_test))
+    return {'model': name, 'fit_s': fit_time, 'predict_s': latency, 'accuracy': accuracy,
+            'train_samples': len(X_train)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the hitability models.')
+    parser.add_argument('--data', default='1kdata/20k_data.csv')
+    parser.add_argument('--labels', default='1kdata/20k_labels.csv')
+    parser.add_argument('--models', nargs='+', default=sorted(HIT_PARAMS), choices=sorted(HIT_PARAMS))
+    parser.add_argument('--json', default=None, help='Also write the results to this file.')
+    args = parser.parse_args()
+
+    mhl = load_training_data(args.data, args.labels)
+    X = mhl[HIT_FEATURES].values
+    y = hitable(mhl['f'].values).astype(int)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1, random_state=42)
+
+    results = [benchmark(name, X_train, X_test, y_train, y_test) for name in args.models]
+    print('{:<8}{:>10}{:>14}{:>10}'.format('model', 'fit (s)', 'predict (us)', 'accuracy'))
+    for r in results:
+        print('{:<8}{:>10.3f}{:>14.1f}{:>10.4f}'.format(r['model'], r['fit_s'], r['predict_s'] * 1e6,
+                                                      r['accuracy']))
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
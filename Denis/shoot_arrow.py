@@ -22,15 +22,19 @@ from __future__ import print_function
 
 from builtins import range
 from past.utils import old_div
-from util.movement import point_to
+from util.movement import AimController
 from util.targeting import find_target_coords
 from util.targeting import target_yaw_obs
 from util.targeting import sim_shot
 from util.spawning import find_con_spawn
-from sklearn.neural_network import MLPRegressor
-from sklearn.model_selection import train_test_split
-import pandas as pd
-from sklearn.svm import SVC
+from util.models import get_network
+from util.inference import mlp_predict
+from util.inference import hit_predict
+from util.runner import AgentRunner
+from util.runner import draw_force
+from util.spans import SpanRecorder
+from util.spans import print_summary
+from util.spans import span
 
 import MalmoPython
 import os
@@ -104,6 +108,15 @@ def get_mission_xml(x, y, z, obx, oby, obz):
             </Mission>'''.format(x, y, z, obx, oby, obz, obx, oby, obz)
 
 
+def shot(recorder, drawn, pitch, yaw, f):
+    """
+    Record the shot once the bow is released, with the force of the draw
+    that was made rather than the f it was planned with.
+    """
+    print('Shot... drew the bow for', round(drawn, 3), 's')
+    recorder.shot(shot=True, pitch=pitch, yaw=yaw, f=draw_force(drawn), planned_f=f)
+
+
 # Create default Malmo objects:
 agent_host = MalmoPython.AgentHost()
 try:
@@ -119,73 +132,9 @@ if agent_host.receivedArgument("help"):
 data_path = '1kdata/20k_data.csv'
 label_path = '1kdata/20k_labels.csv'
 
-data = pd.read_csv(data_path, low_memory=False)
-label = pd.read_csv(label_path, low_memory=False)
-
-headers = ['x', 'y', 'z']
-num_objs = (data.shape[1] - 3) // 2
-
-dists = []
-heights = []
-for i in range(num_objs):
-    dists.append('dist_' + str(i))
-    heights.append('height_' + str(i))
-    headers.append('dist_' + str(i))
-    headers.append('height_' + str(i))
-
-data.columns = headers
-data = data.replace(to_replace='None', value=0).astype('float')
-
-h_col = data[heights].idxmax(axis=1)
-h_ind = [data.columns.get_loc(c) for c in h_col]
-
-data_mh_list = [data.iloc[i, [0, 1, 2, h_ind[i] - 1, h_ind[i]]].tolist() for i in range(len(h_ind))]
-mh_headers = ['x', 'y', 'z', 'dist', 'height']
-mh = pd.DataFrame(data_mh_list, columns=mh_headers)
-mhl = label.join(mh)
-
-hitable_groups = mhl.groupby(lambda x: 'Hitable' if mhl.iloc[x]['f'] != 0 else 'Unhitable')
-mhl_hit = hitable_groups.get_group('Hitable')
-mhl_unhit = hitable_groups.get_group('Unhitable')
-
-mhf = mhl.groupby('f').get_group(1.0) # Max Force only allows hitable
-hitable = mhl['f'].mask(mhl['f'] > 0, 1)
-
-X = mhl[['x', 'y', 'z', 'dist', 'height']]
-X_train, X_test, y_train, y_test = train_test_split(X[:15000],
-                                                    hitable[:15000],
-                                                    test_size=0.1,
-                                                    random_state=42)
-
-svc = SVC(gamma=0.1, kernel='rbf')
-svc.fit(X_train, y_train)
-
-cols = ['y', 'dist', 'height']
-target_distance = pd.DataFrame(np.sqrt(np.square(mhl_hit['x']) + np.square(mhl_hit['z'])), columns=['target_distance'])
-X = pd.concat([target_distance, mhl_hit[cols]], axis=1)
-y = mhl_hit[['f', 'pitch']]
-
-# X = X.head(500)
-# y = y.head(500)
-
-X_train, X_test, y_train, y_test = train_test_split(X,
-                                                    y,
-                                                    test_size=0.1,
-                                                    random_state=69)
-
-mlr = MLPRegressor(activation='logistic', tol=1e-6, solver='lbfgs', random_state=1, alpha=10,
-                   hidden_layer_sizes=(50,30))
-
-#X_train = X_train.head(1000)
-#y_train = y_train.head(1000)
-
-train_mean = X_train.mean()
-train_std = X_train.std()
-print(train_mean.values, train_std.values)
-X_train = (X_train - train_mean)/train_std
-
-mlr.fit(X_train, y_train)
-print('Predictor Trained')
+net = get_network(data_path, label_path)
+print(net['train_mean'], net['train_std'])
+print('Predictor Loaded')
 
 
 # Continually do the mission
@@ -204,58 +153,51 @@ z = 323
 image = False
 if len(sys.argv) > 1:
     image = sys.argv[1].lower() == 'true'
+runner = AgentRunner(agent_host)
+recorder = SpanRecorder().activate()
 while True:
     missionXML = get_mission_xml(x, y, z, obx, oby, obz)
     my_mission = MalmoPython.MissionSpec(missionXML, True)
     my_mission_record = MalmoPython.MissionRecordSpec()
 
-    # Attempt to start a mission:
-    max_retries = 3
-    for retry in range(max_retries):
-        try:
-            agent_host.startMission( my_mission, my_mission_record )
-            break
-        except RuntimeError as e:
-            if retry == max_retries - 1:
-                print("Error starting mission:",e)
-                exit(1)
-            else:
-                time.sleep(2)
-
-    # Loop until mission starts:
+    # Attempt to start a mission and wait for it to begin:
     print("Waiting for the mission to start ", end=' ')
-    world_state = agent_host.getWorldState()
-    while not world_state.has_mission_begun:
-        print(".", end="")
-        time.sleep(0.1)
-        world_state = agent_host.getWorldState()
-        for error in world_state.errors:
-            print("Error:",error.text)
+    try:
+        runner.start_mission(my_mission, my_mission_record)
+    except RuntimeError as e:
+        print("Error starting mission:",e)
+        exit(1)
 
     print()
     print("Mission running ", end=' ')
 
-    # Loop until mission ends:
+    # Handle each new observation until mission ends:
     count = 1
     grid = None
-    while world_state.is_mission_running:
+    aim = AimController(turn_speed=180, threshold=0.1)
+    for world_state in runner.world_states():
         if total_shots > shots:
             break
         if world_state.observations and grid is None:
             tar_block = 'diamond_block'
-            obvsCube = world_state.observations[0].text
-            grid = json.loads(obvsCube)
-            ty, tx, tz, dist, yaw, obs = target_yaw_obs(tar_block, grid, obx, oby, obz, tar_block, record=False, image=image)
-            x, y, z = find_con_spawn(con_x, con_z, obx, grid['Map'], obx, oby, x, y, z)
+            with span('grid_parse'):
+                obvsCube = world_state.observations[0].text
+                grid = json.loads(obvsCube)
+            with span('targeting'):
+                ty, tx, tz, dist, yaw, obs = target_yaw_obs(tar_block, grid, obx, oby, obz, tar_block, record=False, image=image)
+            with span('spawn'):
+                x, y, z = find_con_spawn(con_x, con_z, obx, grid['Map'], obx, oby, x, y, z)
             obstacles = [ [x[0], x[1]] for x in [z[1] for z in obs]]
             obstacles = np.asarray(obstacles)
             tallest = np.argmax(obstacles, axis=0)
             tallest_obj = obstacles[tallest[1]]
             X = np.asarray([tx] + [ty] + [tz] + [tallest_obj[0]] + [tallest_obj[1]])
-            if svc.predict(X.reshape(1,-1))[0] == 1:
+            with span('hit_predict'):
+                hittable = hit_predict(net, X)[0] == 1
+            if hittable:
                 X = np.asarray([dist] + [ty] + [tallest_obj[0]] + [tallest_obj[1]])
-                X = (X - train_mean)/train_std
-                preds = mlr.predict(X.reshape(1,-1))
+                with span('aim_predict'):
+                    preds = mlp_predict(net, X)
                 print(preds)
                 f = preds[0][0]
                 pitch = preds[0][1]
@@ -277,14 +219,11 @@ while True:
         if world_state.number_of_observations_since_last_state > 0:
             obvsText = world_state.observations[-1].text
             data = json.loads(obvsText) # observation comes in as a JSON string...
-            if point_to(agent_host, data, pitch, yaw, 0.1) and count > 0: # pitch is not None and
+            if aim.update(runner, data, pitch, yaw) and count > 0: # pitch is not None and
                 count -= 1
                 
-                agent_host.sendCommand('use 1')
                 print('Shooting...')
-                time.sleep(f)
-                print('Shot...')
-                agent_host.sendCommand('use 0')
+                runner.draw_bow(f, lambda drawn: shot(recorder, drawn, pitch, yaw, f))
 
                 dist_from_target = abs(ty+0.5-arr_h)
                 total_shots += 1
@@ -298,13 +237,13 @@ while True:
                 print('Average distance of missed shots ' + str(np.average(np.asarray(missed_distance))))
                 print('Median distance of missed shots ' + str(np.median(np.asarray(missed_distance))))
 
-        time.sleep(0.1)
-        world_state = agent_host.getWorldState()
-        for error in world_state.errors:
-            print("Error:",error.text)
-
     print()
     print("Mission ended")
+    print("Observation to command latency (ms):", runner.latency_summary())
+    print("Time to aim (ms):", aim.aim_summary())
+    if recorder.stages:
+        recorder.shot(shot=False)
+    print_summary(recorder.summary())
 
 # t_to_target = math.log((1 - (0.01*(dist/(v0*math.cos(math.radians(-1*pitch)))))), 0.99) + 1
 #             print(t_to_target)
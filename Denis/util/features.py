@@ -0,0 +1,182 @@
+
+import numpy as np
+
+
+def split_rows(rows):
+    """
+    Split ragged sample rows of [x, y, z, dist_0, height_0, dist_1, ...]
+    into padded numpy matrices without looping over every value in python.
+
+    input:
+        rows (list) - A list of lists of floats, one per sample.
+
+    output:
+        A tuple of (targets, dists, heights). targets is (N, 3) and dists
+        and heights are (N, K) where K is the most obstacles in any row.
+        Missing values are nan.
+    """
+    lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+    width = max(int(lengths.max()) if lengths.size else 0, 3)
+    width += (width - 3) % 2
+    flat = np.fromiter((v for row in rows for v in row), dtype=float, count=int(lengths.sum()))
+    padded = np.full((len(rows), width), np.nan)
+    padded[np.arange(width) < lengths[:, None]] = flat
+    return padded[:, :3], padded[:, 3::2], padded[:, 4::2]
+
+
+def max_height_obstacle(dists, heights):
+    """
+    Find the tallest obstacle of every sample at once. Ties go to the
+    first obstacle, like DataFrame.idxmax.
+
+    input:
+        dists (array) - (N, K) obstacle distances, nan padded.
+
+        heights (array) - (N, K) obstacle heights, nan padded.
+
+    output:
+        A tuple of (dist, height) arrays for the tallest obstacle of each
+        sample, nan for samples without obstacles.
+    """
+    heights = np.asarray(heights, dtype=float)
+    dists = np.asarray(dists, dtype=float)
+    if heights.shape[1] == 0:
+        return np.full(len(heights), np.nan), np.full(len(heights), np.nan)
+    tallest = np.argmax(np.where(np.isnan(heights), -np.inf, heights), axis=1)
+    rows = np.arange(len(heights))
+    return dists[rows, tallest], heights[rows, tallest]
+
+
+def max_height_ragged(obstacles, offsets):
+    """
+    The same as max_height_obstacle, but for obstacles stored back to back
+    in one (M, 2) array of (dist, height) where sample i's obstacles are
+    obstacles[offsets[i]:offsets[i+1]].
+    """
+    obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    dist = np.full(len(offsets) - 1, np.nan)
+    height = np.full(len(offsets) - 1, np.nan)
+    has = offsets[1:] > offsets[:-1]
+    if not has.any():
+        return dist, height
+
+    starts = offsets[:-1][has]
+    sample = np.repeat(np.arange(len(starts)), np.diff(offsets)[has])
+    h = obstacles[offsets[0]:offsets[-1], 1]
+    top = np.maximum.reduceat(h, starts - offsets[0])
+    index = np.arange(h.size)
+    first = np.minimum.reduceat(np.where(h == top[sample], index, h.size), starts - offsets[0])
+    dist[has] = obstacles[offsets[0] + first, 0]
+    height[has] = top
+    return dist, height
+
+
+def target_distance(x, z):
+    """
+    The horizontal distance from the player to each target.
+    """
+    return np.sqrt(np.square(x) + np.square(z))
+
+
+def hitable(f):
+    """
+    A boolean mask of the samples that can be hit, which are the ones
+    labeled with a force.
+    """
+    f = np.asarray(f, dtype=float)
+    return ~np.isnan(f) & (f != 0)
+
+
+def parse_ragged(text):
+    """
+    Parse whitespace separated rows of numbers, one row per line, in bulk.
+    The numbers are parsed by numpy in one call and the row boundaries are
+    found from the raw bytes, so no python float is made per value.
+
+    input:
+        text (bytes) - Whole lines of text, e.g. a chunk of 1k_data.txt.
+
+    output:
+        A tuple of (flat, offsets) where row i is flat[offsets[i]:offsets[i+1]].
+    """
+    raw = np.frombuffer(text, dtype=np.uint8)
+    if raw.size == 0:
+        return np.empty(0), np.zeros(1, dtype=np.int64)
+    # Spaces, tabs and line endings are all at or below ord(' ').
+    space = raw <= ord(' ')
+    starts = np.flatnonzero(~space[1:] & space[:-1]) + 1
+    if not space[0]:
+        starts = np.concatenate(([0], starts))
+    newlines = np.flatnonzero(raw == ord('\n'))
+    rows = newlines.size + int(raw[-1] != ord('\n'))
+    counts = np.bincount(np.searchsorted(newlines, starts), minlength=rows)
+    flat = np.fromstring(text.decode('ascii'), dtype=float, sep=' ') if starts.size else np.empty(0)
+    if flat.size != counts.sum():
+        raise ValueError('Could not parse every value as a number')
+    return flat, np.concatenate(([0], np.cumsum(counts)))
+
+
+def iter_ragged(filename, chunk_bytes=1 << 22):
+    """
+    Read a file of ragged rows, like 1k_data.txt, in chunks of whole lines
+    so memory stays bounded no matter how big the file is.
+
+    input:
+        filename (str) - The file to read.
+
+        chunk_bytes (int) - About how many bytes to parse at a time.
+
+    output:
+        A generator of (flat, offsets) chunks, see parse_ragged.
+    """
+    with open(filename, 'rb') as f:
+        while True:
+            lines = f.readlines(chunk_bytes)
+            if not lines:
+                return
+            yield parse_ragged(b''.join(lines))
+
+
+def ragged_max_height(flat, offsets):
+    """
+    Reduce ragged rows of [x, y, z, dist_0, height_0, dist_1, ...] to the
+    target and its tallest obstacle. A trailing unpaired value is ignored.
+
+    output:
+        A tuple of (targets, lengths, dist, height). targets is (N, 3), nan
+        for rows with less than three values, lengths is the number of
+        values in each row and dist and height are nan for rows without
+        obstacles.
+    """
+    lengths = np.diff(offsets)
+    targets = np.full((len(lengths), 3), np.nan)
+    full = lengths >= 3
+    targets[full] = flat[offsets[:-1][full, None] + np.arange(3)]
+
+    pairs = np.maximum(lengths - 3, 0) // 2
+    first = offsets[:-1] + 3
+    index = np.repeat(first - 2 * np.concatenate(([0], np.cumsum(pairs)[:-1])), 2 * pairs)
+    obstacles = flat[index + np.arange(index.size)]
+    dist, height = max_height_ragged(obstacles, np.concatenate(([0], np.cumsum(pairs))))
+    return targets, lengths, dist, height
+
+
+def read_max_height(filename, chunk_bytes=1 << 22):
+    """
+    Stream a file of ragged rows, like 1k_data.txt, reducing each row to its
+    target and tallest obstacle in the same pass, so only a few numbers per
+    row are ever kept.
+
+    input:
+        filename (str) - The file to read.
+
+        chunk_bytes (int) - About how many bytes to parse at a time.
+
+    output:
+        The same as ragged_max_height, for every row of the file.
+    """
+    chunks = [ragged_max_height(flat, offsets) for flat, offsets in iter_ragged(filename, chunk_bytes)]
+    if not chunks:
+        return np.empty((0, 3)), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    return tuple(np.concatenate(part) for part in zip(*chunks))
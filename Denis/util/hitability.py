@@ -0,0 +1,160 @@
+
+import numpy as np
+
+
+# Every hitability model is fit on the (tx, ty, tz, obstacle dist, obstacle
+# height) of a shot, see util.models.HIT_FEATURES, and predicts 1 for
+# hitable and 0 for not. The default keyword arguments of each model:
+HIT_PARAMS = {
+    'svc': {'gamma': 0.1, 'kernel': 'rbf'},
+    'gbt': {'max_iter': 200, 'random_state': 0},
+    'reach': {'f': 1},
+}
+
+
+def make_hit_model(name, params=None):
+    """
+    Make an unfitted hitability model. Each has the sklearn fit, predict
+    and decision_function methods.
+
+    input:
+        name (str) - 'svc' for the RBF SVC, 'gbt' for histogram gradient
+                     boosted trees or 'reach' for the ReachBound physics
+                     bound. Both 'gbt' and 'reach' train in linear time.
+
+        params (dict) - Keyword arguments for the model, defaults to
+                        HIT_PARAMS[name].
+
+    output:
+        The unfitted model.
+    """
+    if name not in HIT_PARAMS:
+        raise ValueError('Unknown hitability model: ' + str(name))
+    if params is None:
+        params = HIT_PARAMS[name]
+    if name == 'svc':
+        from sklearn.svm import SVC
+        return SVC(**params)
+    if name == 'gbt':
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        return HistGradientBoostingClassifier(**params)
+    return ReachBound(**params)
+
+
+def arc_height(angles, v_o, dist):
+    """
+    The height of an arrow above the player's feet when it has traveled
+    dist horizontally, the same closed form as Zach's targeting.arc_height.
+    The drag recurrence is a geometric series, so after n ticks the arrow
+    is at
+
+        x_n = v_x * 100 * (1 - 0.99**n)
+        h_n = 1.62 + (v_h + 5) * 100 * (1 - 0.99**n) - 5 * n
+
+    The tick where the arrow passes dist is solved for directly and the
+    height is interpolated along that tick's segment, which is the same
+    straight line sim_shot checks against the target.
+
+    input:
+        angles (array) - Angles above the horizon in degrees.
+
+        v_o (float) - The initial velocity of the arrow.
+
+        dist (array) - Horizontal distances, broadcast against angles.
+
+    output:
+        The heights, nan where the arrow stops before reaching dist.
+    """
+    rad = np.radians(np.asarray(angles, dtype=float))
+    v_x = v_o * np.cos(rad)
+    v_h = v_o * np.sin(rad)
+    dist = np.asarray(dist, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.floor(np.log1p(-dist / (100 * v_x)) / np.log(0.99))
+        s_0 = 100 * (1 - 0.99**k)
+        s_1 = 100 * (1 - 0.99**(k + 1))
+        h_0 = 1.62 + (v_h + 5) * s_0 - 5 * k
+        h_1 = 1.62 + (v_h + 5) * s_1 - 5 * (k + 1)
+        h = h_0 + (h_1 - h_0) * (dist / v_x - s_0) / (s_1 - s_0)
+        return np.where(v_x * 0.99**k > 0.01, h, np.nan)
+
+
+def reach_envelope(dists, f=1, angles=np.arange(-89, 90, 0.5)):
+    """
+    The highest an arrow shot with force f can be at each distance, over
+    every pitch.
+    """
+    v_o = (2 * f) + f**2
+    heights = arc_height(angles[None, :], v_o, np.asarray(dists, dtype=float)[:, None])
+    return np.max(np.where(np.isnan(heights), -np.inf, heights), axis=1)
+
+
+def reach_margin(X, f=1):
+    """
+    How far below the reach envelope the target window and the tallest
+    obstacle are. Negative means no pitch can reach the bottom of the
+    target or get over the obstacle.
+
+    input:
+        X (array) - (N, 5) array of tx, ty, tz, obstacle dist and obstacle
+                    height, or a single row.
+
+        f (float) - The force of the shot.
+
+    output:
+        A 1D array of the smaller of the two margins of each shot, or the
+        target's margin if the shot has no obstacle.
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    dist = np.sqrt(np.square(X[:, 0]) + np.square(X[:, 2]))
+    env = reach_envelope(np.concatenate((dist, X[:, 3])), f)
+    target = env[:len(X)] - (X[:, 1] + 0.25)
+    obstacle = env[len(X):] - (X[:, 4] + 0.5)
+    # A shot without obstacles has nan for their dist and height, and only
+    # the target limits it.
+    obstacle = np.where(np.isnan(X[:, 4]), np.inf, obstacle)
+    return np.minimum(target, obstacle)
+
+
+class ReachBound(object):
+    """
+    A hitability model derived from the arrow physics. A shot is hitable
+    when both the bottom of the target and the top of the tallest obstacle
+    are under the reach envelope, shifted by a margin. Fitting only picks
+    the margin that best separates the training labels, so training is a
+    sort of the samples and predicting needs no stored samples at all.
+
+    input:
+        f (float) - The force whose reach envelope is used.
+
+        margin (float) - The reach margin a shot needs to be hitable,
+                         replaced when fit.
+    """
+
+    def __init__(self, f=1, margin=0.0):
+        self.f = f
+        self.margin = margin
+        self.classes_ = np.array([0, 1])
+
+    def fit(self, X, y):
+        score = reach_margin(X, self.f)
+        y = np.asarray(y).astype(bool)
+        order = np.argsort(score)
+        score, y = score[order], y[order]
+        # Thresholding between i-1 and i calls samples i and up hitable.
+        correct = (np.concatenate(([0], np.cumsum(~y))) +
+                   np.concatenate((np.cumsum(y[::-1])[::-1], [0])))
+        best = np.argmax(correct)
+        if best == 0:
+            self.margin = score[0] - 1e-9
+        elif best == len(score):
+            self.margin = score[-1] + 1e-9
+        else:
+            self.margin = (score[best - 1] + score[best]) / 2
+        return self
+
+    def decision_function(self, X):
+        return reach_margin(X, self.f) - self.margin
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) >= 0).astype(int)]
@@ -0,0 +1,117 @@
+
+import numpy as np
+
+from util.hitability import reach_margin
+
+
+def logistic(x):
+    """
+    The logistic function, within 1e-16 of sklearn's (scipy's expit). It
+    is written with exp(-|x|) so np.exp never overflows.
+    """
+    x = np.asarray(x, dtype=float)
+    z = np.exp(-np.abs(x))
+    return np.where(x >= 0, 1 / (1 + z), z / (1 + z))
+
+
+ACTIVATIONS = {
+    'identity': lambda x: x,
+    'logistic': logistic,
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0),
+}
+
+
+def load_network(filename):
+    """
+    Load the plain numpy weights written by util.models.export_network.
+    Nothing from sklearn is imported, so this is quick to load and to
+    evaluate one shot at a time.
+
+    input:
+        filename (str) - The .npz file the weights were exported to.
+
+    output:
+        A dict of numpy arrays. The MLP layers are 'coef_<i>' and
+        'intercept_<i>' and its inputs are normalized with 'train_mean' and
+        'train_std'. 'hit_model' is the kind of hitability model, an SVC is
+        'support_vectors', 'dual_coef', 'intercept' and 'gamma' and a
+        ReachBound is 'force' and 'margin'.
+    """
+    with np.load(filename) as npz:
+        net = {key: npz[key] for key in npz.files}
+    net['activation'] = str(net['activation'])
+    net['out_activation'] = str(net['out_activation'])
+    net['key'] = str(net['key'])
+    net['hit_model'] = str(net['hit_model'])
+    return net
+
+
+def mlp_predict(net, X):
+    """
+    Evaluate the exported MLPRegressor, the same as mlr.predict.
+
+    input:
+        net (dict) - The weights from load_network.
+
+        X (array) - The (target_distance, ty, obstacle dist, obstacle height)
+                    of one shot or a 2D array of shots, not normalized.
+
+    output:
+        The (f, pitch) predictions, shaped (1, 2) for a single shot.
+    """
+    h = (np.atleast_2d(np.asarray(X, dtype=float)) - net['train_mean']) / net['train_std']
+    layers = int(net['layers'])
+    for i in range(layers):
+        h = np.dot(h, net['coef_' + str(i)]) + net['intercept_' + str(i)]
+        if i < layers - 1:
+            h = ACTIVATIONS[net['activation']](h)
+    return ACTIVATIONS[net['out_activation']](h)
+
+
+def svc_decision(net, X):
+    """
+    The RBF SVC decision function, positive for the second class.
+
+    input:
+        net (dict) - The weights from load_network.
+
+        X (array) - The (tx, ty, tz, obstacle dist, obstacle height) of one
+                    shot or a 2D array of shots.
+
+    output:
+        A 1D array with the decision value of each shot.
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    sv = net['support_vectors']
+    sq_dist = (np.sum(X**2, axis=1)[:, None] + np.sum(sv**2, axis=1)[None, :] -
+               2 * np.dot(X, sv.T))
+    kernel = np.exp(-net['gamma'] * np.maximum(sq_dist, 0))
+    return np.dot(kernel, net['dual_coef'][0]) + net['intercept'][0]
+
+
+def svc_predict(net, X):
+    """
+    Predict the class of each shot, the same as svc.predict.
+    """
+    return net['classes'][(svc_decision(net, X) > 0).astype(int)]
+
+
+def hit_predict(net, X):
+    """
+    Predict if each shot is hitable with whichever hitability model was
+    exported, the same as its predict.
+
+    input:
+        net (dict) - The weights from load_network.
+
+        X (array) - The (tx, ty, tz, obstacle dist, obstacle height) of one
+                    shot or a 2D array of shots.
+
+    output:
+        A 1D array of 1 for hitable and 0 for not.
+    """
+    if net['hit_model'] == 'svc':
+        return svc_predict(net, X)
+    margin = reach_margin(X, float(net['force'])) - net['margin']
+    return net['classes'][(margin >= 0).astype(int)]
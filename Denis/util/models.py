@@ -0,0 +1,249 @@
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from util.features import hitable
+from util.features import max_height_obstacle
+from util.features import target_distance
+from util.hitability import HIT_PARAMS
+from util.hitability import make_hit_model
+from util.inference import load_network
+
+
+# sklearn, pandas and joblib are only imported when the models are trained
+# or unpickled, so loading an exported network with get_network stays quick.
+
+# The features each model is fit on, in order. Changing these changes the
+# schema hash, so saved models are retrained instead of being fed the wrong
+# columns.
+HIT_FEATURES = ['x', 'y', 'z', 'dist', 'height']
+AIM_FEATURES = ['target_distance', 'y', 'dist', 'height']
+AIM_TARGETS = ['f', 'pitch']
+
+MLP_PARAMS = {'activation': 'logistic', 'tol': 1e-6, 'solver': 'lbfgs', 'random_state': 1,
+              'alpha': 10, 'hidden_layer_sizes': (50, 30)}
+
+
+def load_training_data(data_path, label_path):
+    """
+    Read a data/labels CSV pair and reduce each sample's obstacles to the
+    tallest one.
+
+    output:
+        A DataFrame of the labels joined with x, y, z, dist and height.
+    """
+    import pandas as pd
+
+    data = pd.read_csv(data_path, low_memory=False)
+    label = pd.read_csv(label_path, low_memory=False)
+
+    num_objs = (data.shape[1] - 3) // 2
+    dists = ['dist_' + str(i) for i in range(num_objs)]
+    heights = ['height_' + str(i) for i in range(num_objs)]
+    data.columns = ['x', 'y', 'z'] + [c for pair in zip(dists, heights) for c in pair]
+    data = data.replace(to_replace='None', value=0).astype('float')
+
+    mh_dist, mh_height = max_height_obstacle(data[dists].values, data[heights].values)
+    mh = pd.DataFrame({'x': data['x'], 'y': data['y'], 'z': data['z'],
+                       'dist': mh_dist, 'height': mh_height}, columns=HIT_FEATURES)
+    return label.join(mh)
+
+
+def train_models(data_path, label_path, hit_model='svc', hit_params=None, mlp_params=MLP_PARAMS):
+    """
+    Fit the hitability classifier and the force/pitch regressor.
+
+    input:
+        data_path (str) - CSV of tx, ty, tz and the obstacle (dist, height) pairs.
+
+        label_path (str) - CSV of pitch, yaw, f.
+
+        hit_model (str) - Which hitability model to fit, see
+                          util.hitability.make_hit_model.
+
+        hit_params (dict) - Keyword arguments for the hitability model.
+
+        mlp_params (dict) - Keyword arguments for the MLPRegressor.
+
+    output:
+        A dict with the fitted hitability model 'hit' and its name
+        'hit_model', the 'mlr', and the 'train_mean' and 'train_std' numpy
+        arrays the mlr inputs are normalized with.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.neural_network import MLPRegressor
+
+    mhl = load_training_data(data_path, label_path)
+    hit_mask = hitable(mhl['f'].values)
+
+    X_train, X_test, y_train, y_test = train_test_split(mhl[HIT_FEATURES].values[:15000],
+                                                        hit_mask.astype(int)[:15000],
+                                                        test_size=0.1,
+                                                        random_state=42)
+    hit = make_hit_model(hit_model, hit_params)
+    hit.fit(X_train, y_train)
+
+    mhl_hit = mhl[hit_mask]
+    X = np.column_stack((target_distance(mhl_hit['x'].values, mhl_hit['z'].values),
+                         mhl_hit[AIM_FEATURES[1:]].values))
+    y = mhl_hit[AIM_TARGETS].values
+    X_train, X_test, y_train, y_test = train_test_split(X,
+                                                        y,
+                                                        test_size=0.1,
+                                                        random_state=69)
+
+    train_mean = X_train.mean(axis=0)
+    train_std = X_train.std(axis=0, ddof=1)
+    mlr = MLPRegressor(**mlp_params)
+    mlr.fit((X_train - train_mean) / train_std, y_train)
+
+    return {'hit': hit, 'hit_model': hit_model, 'mlr': mlr,
+            'train_mean': train_mean, 'train_std': train_std}
+
+
+def schema_hash():
+    """
+    A hash of the feature layout the models are trained on.
+    """
+    schema = json.dumps([HIT_FEATURES, AIM_FEATURES, AIM_TARGETS])
+    return hashlib.sha1(schema.encode()).hexdigest()
+
+
+def model_key(data_path, label_path, hit_model='svc', hit_params=None, mlp_params=MLP_PARAMS):
+    """
+    A hash of everything the trained models depend on: the contents of the
+    data and label files, the hyperparameters and the feature schema.
+    """
+    key = hashlib.sha1(schema_hash().encode())
+    for path in (data_path, label_path):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                key.update(chunk)
+    if hit_params is None:
+        hit_params = HIT_PARAMS[hit_model]
+    key.update(json.dumps([hit_model, hit_params, mlp_params], sort_keys=True).encode())
+    return key.hexdigest()
+
+
+def save_models(models, filename):
+    """
+    Save a dict of trained models with joblib.
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    import joblib
+    joblib.dump(models, filename)
+
+
+def load_models(filename):
+    """
+    Load models saved with save_models.
+    """
+    import joblib
+    return joblib.load(filename)
+
+
+def get_models(data_path, label_path, filename='models/shoot_arrow_models.pkl',
+               hit_model='svc', hit_params=None, mlp_params=MLP_PARAMS):
+    """
+    Load the trained models from filename, only training them again if the
+    data, labels, hyperparameters or feature schema changed since they
+    were saved.
+
+    input:
+        data_path (str) - CSV of tx, ty, tz and the obstacle (dist, height) pairs.
+
+        label_path (str) - CSV of pitch, yaw, f.
+
+        filename (str) - Where the trained models are kept.
+
+        hit_model (str) - Which hitability model to fit, see
+                          util.hitability.make_hit_model.
+
+        hit_params (dict) - Keyword arguments for the hitability model.
+
+        mlp_params (dict) - Keyword arguments for the MLPRegressor.
+
+    output:
+        The dict from train_models, plus its 'key' and 'schema'.
+    """
+    key = model_key(data_path, label_path, hit_model, hit_params, mlp_params)
+    if os.path.exists(filename):
+        models = load_models(filename)
+        if models.get('key') == key:
+            return models
+    print('Training models on', data_path, label_path)
+    models = train_models(data_path, label_path, hit_model, hit_params, mlp_params)
+    models['key'] = key
+    models['schema'] = schema_hash()
+    save_models(models, filename)
+    return models
+
+
+def export_network(models, filename):
+    """
+    Write the weights of the models from get_models into a .npz file of
+    plain numpy arrays that util.inference can evaluate without sklearn.
+    The 'svc' and 'reach' hitability models can be exported.
+
+    input:
+        models (dict) - The dict from get_models.
+
+        filename (str) - The .npz file to write.
+    """
+    mlr = models['mlr']
+    hit = models['hit']
+    arrays = {'layers': np.array(len(mlr.coefs_)),
+              'activation': np.array(mlr.activation),
+              'out_activation': np.array(mlr.out_activation_),
+              'train_mean': np.asarray(models['train_mean'], dtype=float),
+              'train_std': np.asarray(models['train_std'], dtype=float),
+              'hit_model': np.array(models['hit_model']),
+              'classes': hit.classes_,
+              'key': np.array(models['key'])}
+    if models['hit_model'] == 'svc':
+        arrays.update(support_vectors=hit.support_vectors_,
+                      dual_coef=hit.dual_coef_,
+                      intercept=hit.intercept_,
+                      gamma=np.array(hit._gamma))
+    elif models['hit_model'] == 'reach':
+        arrays.update(force=np.array(hit.f), margin=np.array(hit.margin))
+    else:
+        raise ValueError("Can't export a " + models['hit_model'] + ' hitability model')
+    for i, (coef, intercept) in enumerate(zip(mlr.coefs_, mlr.intercepts_)):
+        arrays['coef_' + str(i)] = coef
+        arrays['intercept_' + str(i)] = intercept
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    np.savez(filename, **arrays)
+
+
+def get_network(data_path, label_path, filename='models/shoot_arrow_network.npz',
+                models_filename='models/shoot_arrow_models.pkl',
+                hit_model='svc', hit_params=None, mlp_params=MLP_PARAMS):
+    """
+    The same as get_models, but returns the exported numpy weights from
+    util.inference.load_network. sklearn is only imported when the export
+    is missing or out of date.
+
+    input:
+        filename (str) - Where the exported weights are kept.
+
+        models_filename (str) - Where get_models keeps the sklearn models.
+
+    output:
+        The dict from util.inference.load_network.
+    """
+    key = model_key(data_path, label_path, hit_model, hit_params, mlp_params)
+    if os.path.exists(filename):
+        net = load_network(filename)
+        if net['key'] == key:
+            return net
+    models = get_models(data_path, label_path, models_filename, hit_model, hit_params, mlp_params)
+    export_network(models, filename)
+    return load_network(filename)
@@ -1,7 +1,10 @@
 
 import math
+import time
+import numpy as np
 
 from past.utils import old_div
+from util.spans import add
 
 def point_to(agent_host, ob, target_pitch, target_yaw, threshold):
     """
@@ -58,3 +61,146 @@ def angvel(target, current, scale):
     while delta > 180:
         delta -= 360;
     return (old_div(2.0, (1.0 + math.exp(old_div(-delta,scale))))) - 1.0
+
+
+def wrap_angle(delta):
+    """
+    The same angle in degrees between -180 and 180.
+    """
+    return (delta + 180.0) % 360.0 - 180.0
+
+
+class AimController(object):
+    """
+    Aims the agent by predicting where it will be looking instead of
+    steering a little on every observation like point_to. With
+    ContinuousMovementCommands the agent turns at rate * turn_speed degrees
+    per second, so the command that closes the error is known: both axes
+    are turned at the rates that land on the target together and the stop
+    commands are scheduled for the moment they get there. Once the move is
+    over the next observation is checked and a smaller correction is made
+    if the target was missed, so the agent is usually on target within one
+    or two ticks of the move ending.
+
+    Scheduling the stop needs an AgentRunner. With a plain agent host the
+    rates are chosen to close the error over ticks observations instead.
+
+    input:
+        turn_speed (float) - The turnSpeedDegs of ContinuousMovementCommands
+                             in the mission XML.
+
+        threshold (float) - How far, as |delta pitch| + |delta yaw|, from
+                            the target the agent may look when aimed.
+
+        tick (float) - The expected seconds between observations, updated
+                       from the observations that arrive.
+
+        ticks (int) - How many observations a plain agent host takes to
+                      close the error.
+    """
+
+    def __init__(self, turn_speed=180.0, threshold=0.1, tick=0.05, ticks=2):
+        self.turn_speed = turn_speed
+        self.threshold = threshold
+        self.tick = tick
+        self.ticks = ticks
+        self.target = None
+        self.started = None
+        self.moving_until = None
+        self.turning = False
+        self.last_update = None
+        self.aimed = False
+        self.moves = 0
+        self.aim_times = []
+
+    def update(self, agent_host, ob, target_pitch, target_yaw):
+        """
+        Steer towards the target pitch/yaw from a new observation.
+
+        input:
+            agent_host (agent_host) - The AgentRunner or agent_host to send
+                                      commands to.
+
+            ob (dict) - The observation, anything with get for the 'Pitch'
+                        and 'Yaw'.
+
+            target_pitch (float) - The pitch to aim at, down is positive.
+
+            target_yaw (float) - The yaw to aim at, south is 0.
+
+        output:
+            True when the agent is aimed at the target.
+        """
+        clock = getattr(agent_host, 'clock', time)
+        now = clock.time()
+        if self.last_update is not None:
+            # Track the observation rate, ignoring gaps like the shot.
+            interval = now - self.last_update
+            if interval < 4 * self.tick:
+                self.tick += 0.2 * (interval - self.tick)
+        self.last_update = now
+
+        if self.target != (target_pitch, target_yaw):
+            self.target = (target_pitch, target_yaw)
+            self.started = now
+            self.moving_until = None
+            self.aimed = False
+            self.moves = 0
+
+        # Observations taken before the stop was applied are out of date.
+        if self.moving_until is not None and now < self.moving_until + self.tick:
+            return False
+
+        delta_pitch = target_pitch - ob.get(u'Pitch', 0)
+        delta_yaw = wrap_angle(target_yaw - ob.get(u'Yaw', 0))
+        if abs(delta_pitch) + abs(delta_yaw) < self.threshold:
+            if self.turning:
+                agent_host.sendCommand("turn 0")
+                agent_host.sendCommand("pitch 0")
+                self.turning = False
+            if not self.aimed:
+                self.aimed = True
+                self.aim_times.append(now - self.started)
+                add('aim', now - self.started, clock)
+            return True
+
+        self.aimed = False
+        self.moves += 1
+        if hasattr(agent_host, 'schedule'):
+            # Turn for at least a tick so small corrections aren't swamped
+            # by the timing of the stop.
+            duration = max(max(abs(delta_pitch), abs(delta_yaw)) / self.turn_speed, self.tick)
+            agent_host.unschedule("turn 0")
+            agent_host.unschedule("pitch 0")
+            agent_host.sendCommand("turn " + str(delta_yaw / (self.turn_speed * duration)))
+            agent_host.sendCommand("pitch " + str(delta_pitch / (self.turn_speed * duration)))
+            agent_host.schedule(duration, "turn 0")
+            agent_host.schedule(duration, "pitch 0")
+            self.moving_until = now + duration
+        else:
+            duration = self.tick * self.ticks
+            agent_host.sendCommand("turn " + str(self.rate(delta_yaw, duration)))
+            agent_host.sendCommand("pitch " + str(self.rate(delta_pitch, duration)))
+            self.turning = True
+        return False
+
+    def rate(self, delta, duration):
+        """
+        The turn rate, between -1 and 1, that turns delta degrees in
+        duration seconds, or as close as it can.
+        """
+        return max(-1.0, min(1.0, delta / (self.turn_speed * duration)))
+
+    def aim_summary(self):
+        """
+        The time it took to aim at each target so far.
+
+        output:
+            A dict of the 'count' of targets aimed at and the 'mean', 'p50',
+            'p95' and 'max' time to aim in milliseconds.
+        """
+        if not self.aim_times:
+            return {'count': 0}
+        ms = np.asarray(self.aim_times) * 1000
+        return {'count': len(ms), 'mean': float(ms.mean()), 'p50': float(np.percentile(ms, 50)),
+                'p95': float(np.percentile(ms, 95)), 'max': float(ms.max())}
@@ -0,0 +1,234 @@
+from __future__ import print_function
+
+import heapq
+import itertools
+import time
+import numpy as np
+
+from util.spans import add
+from util.spans import span
+
+
+def draw_force(drawn):
+    """
+    The force f of the targeting an arrow is shot with when the bow is
+    drawn for drawn seconds, a full draw takes a second.
+    """
+    return min(drawn, 1.0)
+
+
+class AgentRunner(object):
+    """
+    Drives missions on an agent host without a fixed sleep between world
+    states. Malmo has no observation callback, so the runner polls with an
+    adaptive delay: it starts at min_poll after every observation and backs
+    off up to max_poll while nothing new arrives. Every world state with new
+    observations is handed to the mission loop as soon as it's seen.
+
+    The runner can be passed anywhere an agent host is used to send
+    commands (e.g. point_to), and it times how long it takes from an
+    observation arriving to the first command sent in response. Commands
+    can also be scheduled for later, e.g. releasing the bow, and are sent
+    at their deadline by the polling loop so observations keep being
+    handled in the meantime.
+
+    input:
+        agent_host (AgentHost) - The Malmo agent host to drive.
+
+        min_poll (float) - The shortest wait between polls in seconds.
+
+        max_poll (float) - The longest wait between polls in seconds.
+
+        client_pool (ClientPool) - The Minecraft clients to start missions
+                                   on, defaults to the agent host's default.
+
+        role (int) - The agent's role in multi-agent missions.
+
+        experiment_id (str) - The experiment id of multi-agent missions.
+
+        clock - What to read the time from and sleep with, anything with
+                time() and sleep(). Defaults to the agent host's clock if
+                it has one, e.g. the simulated time of util.headless, or
+                else the time module.
+    """
+
+    def __init__(self, agent_host, min_poll=0.001, max_poll=0.02, client_pool=None, role=0,
+                 experiment_id='', clock=None):
+        self.agent_host = agent_host
+        self.clock = clock or getattr(agent_host, 'clock', time)
+        self.client_pool = client_pool
+        self.role = role
+        self.experiment_id = experiment_id
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.observed_at = None
+        self.latencies = []
+        self.scheduled = []
+        self.order = itertools.count()
+        self.draw_started = None
+
+    def start_mission(self, mission, record, max_retries=3, retry_wait=2):
+        """
+        Start a mission, retrying like the Malmo examples, and wait for it
+        to begin.
+
+        output:
+            The first world state of the running mission. The RuntimeError
+            of the last attempt is raised if the mission couldn't start.
+        """
+        with span('mission_start'):
+            for retry in range(max_retries):
+                try:
+                    if self.client_pool is None:
+                        self.agent_host.startMission(mission, record)
+                    else:
+                        self.agent_host.startMission(mission, self.client_pool, record, self.role,
+                                                     self.experiment_id)
+                    break
+                except RuntimeError:
+                    if retry == max_retries - 1:
+                        raise
+                    self.clock.sleep(retry_wait)
+
+        self.latencies = []
+        self.scheduled = []
+        self.draw_started = None
+        with span('mission_begin'):
+            return self.poll(lambda world_state: world_state.has_mission_begun)
+
+    def poll(self, ready):
+        """
+        Get world states until ready(world_state) is True or the mission
+        isn't running anymore, backing off while nothing changes.
+
+        output:
+            The world state that was ready, or the last one.
+        """
+        delay = self.min_poll
+        while True:
+            self.send_due()
+            world_state = self.agent_host.getWorldState()
+            for error in world_state.errors:
+                print("Error:", error.text)
+            if ready(world_state) or (world_state.has_mission_begun and
+                                      not world_state.is_mission_running):
+                return world_state
+            # Wake up early for a scheduled command.
+            wait = delay
+            if self.scheduled:
+                wait = min(wait, max(self.scheduled[0][0] - self.clock.time(), 0))
+            self.clock.sleep(wait)
+            delay = min(delay * 2, self.max_poll)
+
+    def world_states(self):
+        """
+        Yield each world state with new observations until the mission ends.
+
+        output:
+            A generator of world states.
+        """
+        while True:
+            world_state = self.poll(lambda ws: ws.number_of_observations_since_last_state > 0)
+            if not world_state.is_mission_running:
+                return
+            # The latency is the agent's own work, so it's in wall clock time
+            # even when the mission runs on a simulated clock.
+            self.observed_at = time.time()
+            yield world_state
+
+    def run(self, handler):
+        """
+        Call handler(world_state) for each world state with new observations
+        until the mission ends or the handler returns False.
+        """
+        for world_state in self.world_states():
+            if handler(world_state) is False:
+                return
+
+    def sendCommand(self, command):
+        """
+        Send a command to the agent host, timing it against the observation
+        it responds to.
+        """
+        if self.observed_at is not None:
+            self.latencies.append(time.time() - self.observed_at)
+            self.observed_at = None
+        self.agent_host.sendCommand(command)
+
+    def schedule(self, delay, command, callback=None):
+        """
+        Send a command delay seconds from now without blocking.
+
+        input:
+            delay (float) - Seconds to wait before sending the command.
+
+            command (str) - The command to send.
+
+            callback (function) - Called with the time the command was
+                                  actually sent, optional.
+        """
+        heapq.heappush(self.scheduled, (self.clock.time() + delay, next(self.order), command, callback))
+
+    def unschedule(self, command):
+        """
+        Drop every scheduled command equal to command that hasn't been sent
+        yet.
+        """
+        self.scheduled = [item for item in self.scheduled if item[2] != command]
+        heapq.heapify(self.scheduled)
+
+    def send_due(self):
+        """
+        Send every scheduled command whose deadline has passed.
+        """
+        while self.scheduled and self.scheduled[0][0] <= self.clock.time():
+            _, _, command, callback = heapq.heappop(self.scheduled)
+            self.agent_host.sendCommand(command)
+            if callback is not None:
+                callback(self.clock.time())
+
+    def draw_bow(self, f, on_release=None):
+        """
+        Start drawing the bow and schedule its release f seconds later, the
+        same draw time as sleeping for f between 'use 1' and 'use 0'. The
+        actual draw time can be turned into the force the arrow was shot
+        with by draw_force.
+
+        input:
+            f (float) - How long to draw the bow in seconds.
+
+            on_release (function) - Called with the actual draw time,
+                                    optional.
+        """
+        self.sendCommand('use 1')
+        self.draw_started = self.clock.time()
+
+        def released(now):
+            duration = now - self.draw_started
+            self.draw_started = None
+            add('draw', duration, self.clock)
+            if on_release is not None:
+                on_release(duration)
+
+        self.schedule(f, 'use 0', released)
+
+    @property
+    def drawing(self):
+        """
+        True while the bow is drawn and not released yet.
+        """
+        return self.draw_started is not None
+
+    def latency_summary(self):
+        """
+        The observation to command latency of the mission so far.
+
+        output:
+            A dict of the 'count' of responses and the 'mean', 'p50', 'p95'
+            and 'max' latency in milliseconds.
+        """
+        if not self.latencies:
+            return {'count': 0}
+        ms = np.asarray(self.latencies) * 1000
+        return {'count': len(ms), 'mean': float(ms.mean()), 'p50': float(np.percentile(ms, 50)),
+                'p95': float(np.percentile(ms, 95)), 'max': float(ms.max())}
@@ -0,0 +1,218 @@
+
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.base import clone
+from sklearn.model_selection import KFold
+from sklearn.model_selection import ParameterGrid
+from sklearn.model_selection import ParameterSampler
+
+
+# Set in each worker by init_worker so the data is only sent once per process.
+_worker = {}
+
+
+def init_worker(estimator, X, y):
+    _worker.update(estimator=estimator, X=X, y=y)
+
+
+def fit_fold(task):
+    """
+    Fit the estimator with one set of parameters on one fold and score it.
+
+    input:
+        task (tuple) - (params, train, test), where train and test are the
+                       indices of the fold's samples.
+
+    output:
+        A dict of the test 'score' (the estimator's score, R^2 for
+        regressors) and the 'fit_time' in seconds.
+    """
+    params, train, test = task
+    X, y = _worker['X'], _worker['y']
+    model = clone(_worker['estimator']).set_params(**params)
+    start = time.time()
+    model.fit(X[train], y[train])
+    fit_time = time.time() - start
+    return {'score': float(model.score(X[test], y[test])), 'fit_time': fit_time}
+
+
+def task_key(estimator, params, fold, resources, data_key, random_state):
+    """
+    A hash naming the cached result of one (params, fold) fit.
+    """
+    key = json.dumps([repr(clone(estimator).set_params(**params)), fold, resources, data_key, random_state],
+                     sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def data_hash(X, y):
+    """
+    A hash of the training data, so cached results are only reused for the
+    same samples.
+    """
+    key = hashlib.sha1(np.ascontiguousarray(X, dtype=float).tobytes())
+    key.update(np.ascontiguousarray(y, dtype=float).tobytes())
+    return key.hexdigest()
+
+
+def evaluate(estimator, candidates, X, y, folds, resources, cache_dir, workers=None, random_state=0):
+    """
+    Cross validate every candidate, running the fits that aren't cached yet
+    across a pool of processes. Each (params, fold) result is written to
+    cache_dir as soon as it finishes, so an interrupted search picks up
+    where it stopped.
+
+    input:
+        estimator - The unfitted sklearn estimator.
+
+        candidates (list) - A list of parameter dicts.
+
+        X (array) - The features.
+
+        y (array) - The targets.
+
+        folds (list) - A list of (train, test) index arrays.
+
+        resources (int) - How many of each fold's training samples to fit
+                          on, None for all of them. They are a random
+                          sample of the fold, the first resources of a
+                          seeded permutation, so a larger resources fits on
+                          the same samples and more.
+
+        cache_dir (str) - Directory of the cached results.
+
+        workers (int) - Number of processes, defaults to the number of cores.
+
+        random_state (int) - Seed of the permutation resources are taken from.
+
+    output:
+        A list with a list of each candidate's fold results, see fit_fold.
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    data_key = data_hash(X, y)
+    if resources is not None:
+        # The folds of KFold are contiguous, so a slice of one would only
+        # cover part of the data.
+        folds = [(np.random.RandomState(random_state).permutation(train)[:resources], test)
+                 for train, test in folds]
+    results = [[None] * len(folds) for _ in candidates]
+    todo = []
+    for i, params in enumerate(candidates):
+        for j, (train, test) in enumerate(folds):
+            key = task_key(estimator, params, j, resources, data_key, random_state)
+            filename = os.path.join(cache_dir, key + '.json')
+            if os.path.exists(filename):
+                with open(filename) as f:
+                    results[i][j] = json.load(f)
+            else:
+                todo.append((i, j, filename, (params, train, test)))
+
+    if todo:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(estimator, X, y)) as pool:
+            for (i, j, filename, _), result in zip(todo, pool.map(fit_fold, [t[3] for t in todo])):
+                with open(filename + '.tmp', 'w') as f:
+                    json.dump(result, f)
+                os.replace(filename + '.tmp', filename)
+                results[i][j] = result
+    return results
+
+
+def search(estimator, param_grid, X, y, method='grid', cv=5, n_iter=10, factor=3,
+           min_resources=None, cache_dir='search_cache', workers=None, random_state=0):
+    """
+    A cross validated hyperparameter search like GridSearchCV, but the fits
+    run in parallel, every (params, fold) result is cached on disk and bad
+    parameters can be dropped early with successive halving.
+
+    input:
+        estimator - The unfitted sklearn estimator.
+
+        param_grid (dict or list) - The parameters to search, the same as
+                                    GridSearchCV's param_grid. For 'random'
+                                    a list of dicts is not supported.
+
+        X (array) - The features.
+
+        y (array) - The targets.
+
+        method (str) - 'grid' to try every candidate, 'random' to try
+                       n_iter random candidates, or 'halving' to try every
+                       candidate on a few samples and keep the best 1/factor
+                       of them on factor times more samples each round.
+
+        cv (int) - Number of folds.
+
+        n_iter (int) - Number of candidates for 'random'.
+
+        factor (int) - How aggressively 'halving' prunes.
+
+        min_resources (int) - The training samples per fold in the first
+                              'halving' round. Defaults to what lets the
+                              last round use all of them.
+
+        cache_dir (str) - Directory of the cached results.
+
+        workers (int) - Number of processes, defaults to the number of cores.
+
+        random_state (int) - Seed for 'random' and for the training samples
+                             picked in the early 'halving' rounds.
+
+    output:
+        A pandas DataFrame shaped like GridSearchCV.cv_results_, one row for
+        each candidate in its last round, with 'params', 'param_<name>',
+        'split<i>_test_score', 'mean_test_score', 'std_test_score',
+        'rank_test_score', 'mean_fit_time' and 'n_resources'.
+    """
+    import pandas as pd
+
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    folds = list(KFold(cv).split(X))
+    if method == 'random':
+        candidates = list(ParameterSampler(param_grid, n_iter, random_state=random_state))
+    elif method in ('grid', 'halving'):
+        candidates = list(ParameterGrid(param_grid))
+    else:
+        raise ValueError('Unknown search method: ' + str(method))
+
+    max_resources = min(len(train) for train, _ in folds)
+    if method == 'halving':
+        rounds = max(int(np.ceil(np.log(len(candidates)) / np.log(factor))), 1)
+        if min_resources is None:
+            min_resources = max(max_resources // factor**(rounds - 1), min(20, max_resources))
+    else:
+        rounds = 1
+
+    rows = []
+    for r in range(rounds):
+        resources = None
+        if method == 'halving' and r < rounds - 1:
+            resources = min(min_resources * factor**r, max_resources)
+        results = evaluate(estimator, candidates, X, y, folds, resources, cache_dir, workers, random_state)
+        means = np.array([np.mean([res['score'] for res in fold_results]) for fold_results in results])
+
+        keep = len(candidates) if r == rounds - 1 else max(len(candidates) // factor, 1)
+        best = np.argsort(-means, kind='stable')[:keep]
+        for i, (params, fold_results) in enumerate(zip(candidates, results)):
+            if r < rounds - 1 and i in best:
+                continue
+            row = {'params': params, 'n_resources': resources or max_resources, 'iter': r,
+                   'mean_test_score': means[i],
+                   'std_test_score': np.std([res['score'] for res in fold_results]),
+                   'mean_fit_time': np.mean([res['fit_time'] for res in fold_results])}
+            row.update(('param_' + k, v) for k, v in params.items())
+            row.update(('split{}_test_score'.format(j), res['score']) for j, res in enumerate(fold_results))
+            rows.append(row)
+        candidates = [candidates[i] for i in best]
+
+    df = pd.DataFrame(rows)
+    # Candidates that made it to later rounds rank ahead of the ones dropped earlier.
+    df = df.sort_values(['iter', 'mean_test_score'], ascending=False).reset_index(drop=True)
+    df['rank_test_score'] = np.arange(1, len(df) + 1)
+    return df
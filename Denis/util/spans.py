@@ -0,0 +1,195 @@
+from __future__ import print_function
+
+import json
+import sys
+import threading
+import time
+import numpy as np
+
+
+# The recorder of each thread, so agents in a pool keep their own timings.
+_active = threading.local()
+# Recorders in different threads may append to the same file.
+_file_lock = threading.Lock()
+
+
+class SpanRecorder(object):
+    """
+    Times the stages of each shot, e.g. starting the mission, parsing the
+    grid, solving the pitch and aiming, and writes one record per shot.
+    A stage is timed with span, either the recorder's or the module's
+    which times into whichever recorder is active in the thread, so
+    helpers like targeting.py don't need to be passed the recorder. Time
+    spent in a stage more than once per shot is added up. Stages timed on
+    a simulated clock, e.g. aiming and drawing on the headless host, are
+    kept apart from the wall clock ones.
+
+    input:
+        filename (str) - A JSON lines file to append each shot's record
+                         to, optional.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.records = []
+        self.stages = {}
+        self.simulated = {}
+        self.started = time.time()
+
+    def activate(self):
+        """
+        Make this the recorder span times into in the current thread.
+        """
+        _active.recorder = self
+        return self
+
+    def span(self, name):
+        return Span(self, name)
+
+    def add(self, name, seconds, simulated=False):
+        """
+        Add seconds to the time spent in the stage name, seconds of a
+        simulated clock if simulated.
+        """
+        stages = self.simulated if simulated else self.stages
+        stages[name] = stages.get(name, 0.0) + seconds
+
+    def shot(self, **fields):
+        """
+        End the current shot, recording the time spent in each stage since
+        the last one.
+
+        input:
+            fields - Anything else to record, e.g. the port, pitch and force.
+
+        output:
+            The record, a dict of the fields, the 'wall' seconds since the
+            last shot, the 'stages' seconds and the 'simulated' seconds of
+            the stages timed on a simulated clock.
+        """
+        now = time.time()
+        record = dict(fields, time=now, wall=now - self.started, stages=self.stages, simulated=self.simulated)
+        self.stages = {}
+        self.simulated = {}
+        self.started = now
+        with self.lock:
+            self.records.append(record)
+        if self.filename is not None:
+            with _file_lock:
+                with open(self.filename, 'a') as f:
+                    f.write(json.dumps(record, default=float) + '\n')
+        return record
+
+    def summary(self):
+        """
+        The percentiles of each stage over the shots so far, see summarize.
+        """
+        with self.lock:
+            records = list(self.records)
+        return summarize(records)
+
+
+class Span(object):
+    """
+    A context manager adding the time spent in it to a stage of a
+    recorder. Without a recorder it does nothing.
+    """
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        if self.recorder is not None:
+            self.recorder.add(self.name, time.time() - self.start)
+
+
+def span(name):
+    """
+    Time a stage into the thread's active recorder, e.g.
+
+        with span('pitch_solve'):
+            f, pitch = find_pow_pitch(dist, ty, ob_arr)
+    """
+    return Span(getattr(_active, 'recorder', None), name)
+
+
+def add(name, seconds, clock=time):
+    """
+    Add seconds to a stage of the thread's active recorder, for times
+    that aren't measured around a block, e.g. the bow's draw. The seconds
+    were measured with clock, anything but the time module is taken to be
+    a simulated clock like util.headless.SimClock.
+    """
+    recorder = getattr(_active, 'recorder', None)
+    if recorder is not None:
+        recorder.add(name, seconds, clock is not time)
+
+
+def load_records(filename):
+    """
+    Read the shot records of a JSON lines file.
+    """
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records):
+    """
+    The percentiles of the time spent in each stage per shot.
+
+    input:
+        records (list) - Shot records from SpanRecorder.shot.
+
+    output:
+        A dict of each stage, plus 'wall' for the whole shot, to a dict of
+        the 'count' of shots it was in and the 'mean', 'p50', 'p95' and
+        'max' milliseconds, and if it was timed on a simulated clock
+        'simulated' True. Simulated stages are named '<stage> (simulated)'.
+    """
+    times = {}
+    for record in records:
+        times.setdefault('wall', []).append(record['wall'])
+        for name, seconds in record['stages'].items():
+            times.setdefault(name, []).append(seconds)
+        for name, seconds in record.get('simulated', {}).items():
+            times.setdefault(name + ' (simulated)', []).append(seconds)
+    summary = {}
+    for name, seconds in times.items():
+        ms = np.asarray(seconds) * 1000
+        summary[name] = {'count': len(ms), 'mean': float(ms.mean()),
+                         'p50': float(np.percentile(ms, 50)),
+                         'p95': float(np.percentile(ms, 95)), 'max': float(ms.max()),
+                         'simulated': name.endswith(' (simulated)')}
+    return summary
+
+
+def print_summary(summary):
+    """
+    Print a summary from summarize as a table, slowest stages first. The
+    stages timed on a simulated clock are in a table of their own, since
+    they can't be compared with the wall clock ones.
+    """
+    for simulated in (False, True):
+        names = [name for name in summary if summary[name].get('simulated', False) == simulated]
+        if not names:
+            continue
+        print('{:<24}{:>7}{:>10}{:>10}{:>10}{:>10}'.format('simulated (ms)' if simulated else 'stage (ms)',
+                                                         'count', 'mean', 'p50', 'p95', 'max'))
+        for name in sorted(names, key=lambda n: -summary[n]['mean']):
+            s = summary[name]
+            print('{:<24}{:>7}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(name, s['count'], s['mean'], s['p50'],
+                                                                        s['p95'], s['max']))
+
+
+if __name__ == '__main__':
+    # Summarize recorded shots, e.g. python -m util.spans shots.jsonl
+    records = []
+    for filename in sys.argv[1:]:
+        records += load_records(filename)
+    print_summary(summarize(records))
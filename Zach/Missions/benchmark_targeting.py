@@ -0,0 +1,213 @@
+from __future__ import print_function
+
+# Time the targeting hot paths on saved grid observations, e.g.
+#
+#   python benchmark_targeting.py --json before.json
+#   python benchmark_targeting.py --json after.json --compare before.json
+#
+# The fixtures in data/fixtures are reconstructed, not recorded from Malmo,
+# see util.fixtures.make_fixtures. They are saved with obx 50 and every
+# grid size up to that is cropped out of the same grid.
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import numpy as np
+
+from util.fixtures import list_fixtures
+from util.fixtures import load_fixture
+from util.fixtures import make_fixtures
+from util.grid_observer_parse import get_heightmaps
+from util.targeting import clear_target_cache
+from util.targeting import find_pitch
+from util.targeting import find_pow_pitch
+from util.targeting import find_targets_coords
+from util.targeting import get_obs
+from util.targeting import obs_array
+from util.targeting import obstacle_coords
+from util.targeting import pitch_yaw_force
+from util.targeting import sim_shot
+
+
+FUNCTIONS = ['find_targets_coords', 'get_heightmaps', 'obstacle_coords', 'get_obs', 'sim_shot',
+             'find_pitch', 'find_pow_pitch', 'pitch_yaw_force']
+
+
+def time_call(fn, min_time=0.2, min_repeats=5, max_repeats=1000):
+    """
+    Call fn repeatedly, after one warm up call, until min_time seconds have
+    passed and it ran at least min_repeats times, or it ran max_repeats
+    times.
+
+    output:
+        A dict of the number of 'repeats' and the 'best_ms', 'median_ms'
+        and 'mean_ms' of one call.
+    """
+    fn()
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeats and (len(times) < min_repeats or time.perf_counter() - start < min_time):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    ms = np.asarray(times) * 1000
+    return {'repeats': len(ms), 'best_ms': float(ms.min()), 'median_ms': float(np.median(ms)),
+            'mean_ms': float(ms.mean())}
+
+
+def uncached(fn):
+    """
+    Call fn as if for a new observation, so find_targets_coords has to scan
+    the map again like it does in a mission.
+    """
+    def call():
+        clear_target_cache()
+        return fn()
+    return call
+
+
+def quiet(fn):
+    """
+    Call fn without printing, pitch_yaw_force reports every step.
+    """
+    def call():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return call
+
+
+def cases(grid, obx, oby, block='diamond_block'):
+    """
+    The calls to time for one grid, with the arguments a mission would pass
+    them for the nearest target.
+
+    output:
+        A dict of function name to a function making the call. The target
+        specific calls are left out if there's no target in the grid.
+    """
+    grid_map = grid['Map']
+    px, py, pz = grid['XPos'], grid['YPos'], grid['ZPos']
+    calls = {
+        'find_targets_coords': uncached(lambda: find_targets_coords(grid_map, block, obx, oby, obx, px, py, pz)),
+        'get_heightmaps': lambda: get_heightmaps(grid_map, obx, oby),
+        'pitch_yaw_force': quiet(uncached(lambda: pitch_yaw_force(block, grid, obx, oby, obx, block,
+                                                                  all_targets=True))),
+    }
+    targets = find_targets_coords(grid_map, block, obx, oby, obx, px, py, pz)
+    if not targets:
+        return calls
+
+    tx, ty, tz = targets[0]
+    heights = get_heightmaps(grid_map, obx, oby)
+    coords = obstacle_coords(obx, obx, tx, tz)
+    ob_arr = obs_array(get_obs(grid_map, coords, oby, obx, block, heights=heights))
+    dist = np.sqrt(tx**2 + tz**2)
+    f, pitch = find_pow_pitch(dist, ty, ob_arr)
+    angle = 20 if pitch is None else -pitch
+    calls.update({
+        'obstacle_coords': lambda: obstacle_coords(obx, obx, tx, tz),
+        'get_obs': lambda: get_obs(grid_map, coords, oby, obx, block, heights=heights),
+        'sim_shot': lambda: sim_shot(angle, 3, dist, ty, 1, ob_arr),
+        'find_pitch': lambda: find_pitch(dist, ty, 1, 1, ob_arr),
+        'find_pow_pitch': lambda: find_pow_pitch(dist, ty, ob_arr),
+    })
+    return calls
+
+
+def benchmark(fixtures, sizes, functions, min_time=0.2):
+    """
+    Time every function on every fixture cropped to every size.
+
+    output:
+        A list of result dicts, each with the 'fixture', 'obx', 'function'
+        and the times from time_call.
+    """
+    results = []
+    for name in fixtures:
+        recorded = load_fixture(name)
+        for obx in sizes:
+            if obx > recorded['obx']:
+                print('Skipping', name, 'at obx', obx, 'it was saved with obx', recorded['obx'])
+                continue
+            grid = load_fixture(name, obx)
+            calls = cases(grid, obx, grid['oby'])
+            for function in functions:
+                if function not in calls:
+                    continue
+                result = {'fixture': name, 'obx': obx, 'function': function}
+                result.update(time_call(calls[function], min_time))
+                results.append(result)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Match results with a baseline run by fixture, obx and function.
+
+    output:
+        A list of (result, baseline result, ratio of the medians) for every
+        match, and a list of the ones slower than tolerance times the
+        baseline.
+    """
+    before = dict(((r['fixture'], r['obx'], r['function']), r) for r in baseline)
+    matches = []
+    for r in results:
+        b = before.get((r['fixture'], r['obx'], r['function']))
+        if b is not None:
+            matches.append((r, b, r['median_ms'] / max(b['median_ms'], 1e-9)))
+    return matches, [m for m in matches if m[2] > tolerance]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the targeting functions on reconstructed grids, '
+                                                 'see util.fixtures.make_fixtures.')
+    parser.add_argument('--fixtures', nargs='+', default=None,
+                        help='Fixture names in data/fixtures, defaults to all of them.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 25, 50])
+    parser.add_argument('--functions', nargs='+', default=FUNCTIONS, choices=FUNCTIONS)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Seconds to spend timing each function.')
+    parser.add_argument('--json', default=None, help='Also write the results to this file.')
+    parser.add_argument('--compare', default=None, help='A --json file of an earlier run to compare with.')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='How many times slower than --compare counts as a regression.')
+    parser.add_argument('--make-fixtures', action='store_true',
+                        help='Rebuild the reconstructed mission fixtures first.')
+    args = parser.parse_args()
+
+    if args.make_fixtures:
+        print('Wrote fixtures', make_fixtures())
+    fixtures = args.fixtures or list_fixtures()
+    results = benchmark(fixtures, args.sizes, args.functions, args.min_time)
+
+    print('{:<18}{:>5}  {:<22}{:>8}{:>12}{:>12}'.format('fixture', 'obx', 'function', 'repeats', 'best (ms)',
+                                                      'median (ms)'))
+    for r in results:
+        print('{:<18}{:>5}  {:<22}{:>8}{:>12.3f}{:>12.3f}'.format(r['fixture'], r['obx'], r['function'],
+                                                                r['repeats'], r['best_ms'], r['median_ms']))
+
+    regressions = []
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        matches, regressions = compare(results, baseline, args.tolerance)
+        print()
+        print('{:<18}{:>5}  {:<22}{:>12}{:>12}{:>8}'.format('fixture', 'obx', 'function', 'before (ms)',
+                                                          'after (ms)', 'ratio'))
+        for r, b, ratio in matches:
+            print('{:<18}{:>5}  {:<22}{:>12.3f}{:>12.3f}{:>8.2f}{}'.format(
+                r['fixture'], r['obx'], r['function'], b['median_ms'], r['median_ms'], ratio,
+                '  SLOWER' if ratio > args.tolerance else ''))
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__,
+                       'platform': platform.platform(), 'time': time.time(),
+                       'min_time': args.min_time, 'results': results}, f, indent=2)
+    if regressions:
+        print(len(regressions), 'regressions slower than', args.tolerance, 'times the baseline')
+        sys.exit(1)
@@ -0,0 +1,104 @@
+from __future__ import print_function
+
+# Generate labeled training data offline from synthetic grid observations.
+#
+# Every sample is a random grid from util.synthetic that is run through the
+# same targeting as the missions, so no Minecraft client is needed. Samples
+# are spread over a process pool and written in order, so the same seed
+# always produces the same files no matter how many workers are used.
+#
+#   python generate_data.py --samples 1000000 --seed 1 --workers 8
+
+import argparse
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from util.data_collection import RecordWriter
+from util.pitch_table import build_pitch_table
+from util.pitch_table import table_pow_pitch
+from util.synthetic import random_grid
+from util.targeting import find_pow_pitch
+from util.targeting import obs_array
+from util.targeting import target_yaw_obs
+
+
+# Set in each worker by init_worker so the table is only built once per process.
+_worker = {}
+
+
+def init_worker(obx, oby, seed, mode):
+    _worker.update(obx=obx, oby=oby, seed=seed, mode=mode)
+    if mode == 'table':
+        _worker['table'] = build_pitch_table(obx, oby)
+
+
+def label_sample(i):
+    """
+    Make the i-th random grid and find the pitch, yaw and force to hit its
+    target.
+
+    output:
+        A tuple of (data, labels) rows in the same layout as save_data and
+        save_labels, or None if the target isn't in view.
+    """
+    obx, oby = _worker['obx'], _worker['oby']
+    rng = np.random.default_rng([_worker['seed'], i])
+    grid = random_grid(obx, oby, rng)
+    ty, tx, tz, dist, yaw, obs = target_yaw_obs('diamond_block', grid, obx, oby, obx,
+                                                'diamond_block', verbose=False)
+    if tx is None:
+        return None
+
+    ob_arr = obs_array(obs)
+    if _worker['mode'] == 'table':
+        f, pitch = table_pow_pitch(_worker['table'], dist, ty, ob_arr)
+    else:
+        f, pitch = find_pow_pitch(dist, ty, ob_arr, mode=_worker['mode'])
+
+    data = [tx, ty, tz]
+    for ob in obs:
+        data.append(ob[1][0])
+        data.append(ob[1][1])
+    return data, [pitch, yaw, f]
+
+
+def generate(samples, seed, workers, data_file, label_file, obx=25, oby=10, mode='sweep',
+             chunksize=64):
+    """
+    Label samples random grids across a pool of worker processes and
+    stream the records to data_file and label_file. Like save_data and
+    save_labels the records are appended to the files.
+    """
+    start = time.time()
+    written = 0
+    with ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=(obx, oby, seed, mode)) as pool, \
+            RecordWriter(data_file) as data_out, RecordWriter(label_file) as label_out:
+        for record in pool.map(label_sample, range(samples), chunksize=chunksize):
+            if record is None:
+                continue
+            data_out.write(record[0])
+            label_out.write(record[1])
+            written += 1
+            if written % 10000 == 0:
+                print('Wrote', written, 'samples in', round(time.time() - start, 1), 's')
+    print('Wrote', written, 'samples in', round(time.time() - start, 1), 's')
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate training data from synthetic grids.')
+    parser.add_argument('--samples', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes, defaults to the number of cores.')
+    parser.add_argument('--obx', type=int, default=25)
+    parser.add_argument('--oby', type=int, default=10)
+    parser.add_argument('--mode', choices=['sweep', 'bisect', 'table'], default='sweep',
+                        help='How the pitch and force are solved.')
+    parser.add_argument('--data', default='data/synthetic_data.csv')
+    parser.add_argument('--labels', default='data/synthetic_labels.csv')
+    args = parser.parse_args()
+    generate(args.samples, args.seed, args.workers, args.data, args.labels,
+             obx=args.obx, oby=args.oby, mode=args.mode)
@@ -22,10 +22,22 @@ from __future__ import print_function
 
 from builtins import range
 from past.utils import old_div
-from util.movement import point_to
+from util.movement import AimController
 from util.targeting import find_target_coords
 from util.targeting import pitch_yaw_force
+from util.pitch_table import get_pitch_table
 from util.spawning import find_con_spawn
+from util.data_collection import flush_records
+from util.grid_observer_parse import get_heightmaps
+from util.runner import AgentRunner
+from util.runner import draw_force
+from util.pool import run_pool
+from util.fixtures import save_fixture
+from util.observations import GridTracker
+from util.observations import Observation
+from util.spans import SpanRecorder
+from util.spans import print_summary
+from util.spans import span
 
 import MalmoPython
 import os
@@ -99,89 +111,146 @@ def get_mission_xml(x, y, z, obx, oby, obz):
             </Mission>'''.format(x, y, z, obx, oby, obz, obx, oby, obz)
 
 
-# Create default Malmo objects:
-agent_host = MalmoPython.AgentHost()
-try:
-    agent_host.parse( sys.argv )
-except RuntimeError as e:
-    print('ERROR:',e)
-    print(agent_host.getUsage())
-    exit(1)
-if agent_host.receivedArgument("help"):
-    print(agent_host.getUsage())
-    exit(0)
-
-# Continually do the mission
-con_x = 235
-con_y = 0
-con_z = 315
 obx = obz = 25
 oby = 10
-x = 243
-y = 76
-z = 323
-image = False
-if len(sys.argv) > 1:
-    image = sys.argv[1].lower() == 'true'
-while True:
-    missionXML = get_mission_xml(x, y, z, obx, oby, obz)
-    my_mission = MalmoPython.MissionSpec(missionXML, True)
-    my_mission_record = MalmoPython.MissionRecordSpec()
-
-    # Attempt to start a mission:
-    max_retries = 3
-    for retry in range(max_retries):
+
+
+def shot(recorder, drawn, port, pitch, yaw, f):
+    """
+    Record the shot once the bow is released, with the force of the draw
+    that was made rather than the f it was planned with.
+    """
+    print('Shot... drew the bow for', round(drawn, 3), 's')
+    recorder.shot(port=port, shot=True, pitch=pitch, yaw=yaw, f=draw_force(drawn), planned_f=f)
+
+
+def run_agent(runner, table, aggregator=None, port=None, missions=None, image=False, spans=None,
+              fixtures=None):
+    """
+    Run shooting missions with one agent.
+
+    input:
+        runner (AgentRunner) - The runner of the agent host to use.
+
+        table (dict) - The pitch table from get_pitch_table.
+
+        aggregator (ResultAggregator) - Where to report each mission's
+                                        result, optional.
+
+        port (int) - The client port, only used to label the results.
+
+        missions (int) - How many missions to run, None to run forever.
+
+        image (bool) - If the trajectories should be drawn.
+
+        spans (str) - A JSON lines file to write the time of each shot's
+                      stages to, optional.
+
+        fixtures (str) - A directory to save the first grid of each mission
+                         to, for benchmark_targeting.py. Optional.
+    """
+    con_x = 235
+    con_y = 0
+    con_z = 315
+    x = 243
+    y = 76
+    z = 323
+    tracker = GridTracker(obx, oby)
+    recorder = SpanRecorder(spans).activate()
+    mission = 0
+    while missions is None or mission < missions:
+        mission += 1
+        missionXML = get_mission_xml(x, y, z, obx, oby, obz)
+        my_mission = MalmoPython.MissionSpec(missionXML, True)
+        my_mission_record = MalmoPython.MissionRecordSpec()
+
+        # Attempt to start a mission and wait for it to begin:
+        print("Waiting for the mission to start ", end=' ')
+        runner.start_mission(my_mission, my_mission_record)
+
+        print()
+        print("Mission running ", end=' ')
+
+        # Handle each new observation until mission ends:
+        count = 1
+        grid = None
+        pitch = yaw = f = None
+        aim = AimController(turn_speed=180, threshold=0.1)
+        for world_state in runner.world_states():
+            if world_state.observations and grid is None:
+                tar_block = 'diamond_block'
+                with span('grid_parse'):
+                    obvsCube = Observation(world_state.observations[0].text)
+                    grid = dict(obvsCube.stats, Map=tracker.update(obvsCube))
+                if fixtures is not None:
+                    save_fixture(os.path.join(fixtures, 'mission_{}_{}.npz'.format(port or 0, mission)),
+                                 grid, obx, oby)
+                with span('heightmaps'):
+                    heights = get_heightmaps(grid['Map'], obx, oby)
+                with span('targeting'):
+                    pitch, yaw, f = pitch_yaw_force(tar_block, grid, obx, oby, obz, tar_block, record=False,
+                                                    image=image, table=table, heights=heights, all_targets=True)
+                with span('spawn'):
+                    x, y, z = find_con_spawn(con_x, con_z, obx, grid['Map'], obx, oby, x, y, z, heights=heights)
+#                con_x, con_y, con_z = find_target_coords(grid_map, tar_block, obx, oby, obz)
+
+            if world_state.number_of_observations_since_last_state > 0:
+                obvsText = world_state.observations[-1].text
+                data = Observation(obvsText) # only the stats are parsed, not the grid
+                if pitch is not None and aim.update(runner, data, pitch, yaw) and count > 0:
+                    count -= 1
+                    print('Shooting...')
+                    runner.draw_bow(f, lambda drawn: shot(recorder, drawn, port, pitch, yaw, f))
+
+        flush_records()
+        print()
+        print("Mission ended")
+        print("Observation to command latency (ms):", runner.latency_summary())
+        print("Time to aim (ms):", aim.aim_summary())
+        if recorder.stages:
+            # Nothing was shot, but the time still went somewhere.
+            recorder.shot(port=port, shot=False)
+        print_summary(recorder.summary())
+        if aggregator is not None:
+            aggregator.add({'port': port, 'shots': 1 - count, 'pitch': pitch, 'yaw': yaw, 'f': f,
+                            'latency': runner.latency_summary(), 'aim': aim.aim_summary()})
+
+
+if __name__ == '__main__':
+    # Create default Malmo objects:
+    agent_host = MalmoPython.AgentHost()
+    agent_host.addOptionalStringArgument('ports', 'Comma separated Minecraft client ports to run an agent on each in parallel.', '')
+    agent_host.addOptionalStringArgument('spans', 'JSON lines file to write the time of each shot\'s stages to.', '')
+    agent_host.addOptionalStringArgument('fixtures', 'Directory to record the first grid of each mission to.', '')
+    try:
+        agent_host.parse( sys.argv )
+    except RuntimeError as e:
+        print('ERROR:',e)
+        print(agent_host.getUsage())
+        exit(1)
+    if agent_host.receivedArgument("help"):
+        print(agent_host.getUsage())
+        exit(0)
+
+    image = False
+    if len(sys.argv) > 1:
+        image = sys.argv[1].lower() == 'true'
+    table = get_pitch_table(obx, oby)
+
+    ports = agent_host.getStringArgument('ports')
+    spans = agent_host.getStringArgument('spans') or None
+    fixtures = agent_host.getStringArgument('fixtures') or None
+    if ports:
+        # One agent per client, e.g. --ports 10000,10001,10002
+        aggregator = run_pool([int(p) for p in ports.split(',')],
+                              lambda runner, aggregator, port: run_agent(runner, table, aggregator, port,
+                                                                         image=image, spans=spans,
+                                                                         fixtures=fixtures))
+        print(aggregator.summary())
+    else:
+        # Continually do the mission
         try:
-            agent_host.startMission( my_mission, my_mission_record )
-            break
+            run_agent(AgentRunner(agent_host), table, image=image, spans=spans, fixtures=fixtures)
         except RuntimeError as e:
-            if retry == max_retries - 1:
-                print("Error starting mission:",e)
-                exit(1)
-            else:
-                time.sleep(2)
-
-    # Loop until mission starts:
-    print("Waiting for the mission to start ", end=' ')
-    world_state = agent_host.getWorldState()
-    while not world_state.has_mission_begun:
-        print(".", end="")
-        time.sleep(0.1)
-        world_state = agent_host.getWorldState()
-        for error in world_state.errors:
-            print("Error:",error.text)
-
-    print()
-    print("Mission running ", end=' ')
-
-    # Loop until mission ends:
-    count = 1
-    grid = None
-    while world_state.is_mission_running:
-        if world_state.observations and grid is None:
-            tar_block = 'diamond_block'
-            obvsCube = world_state.observations[0].text
-            grid = json.loads(obvsCube)
-            pitch, yaw, f = pitch_yaw_force(tar_block, grid, obx, oby, obz, tar_block, record=False, image=image)
-            x, y, z = find_con_spawn(con_x, con_z, obx, grid['Map'], obx, oby, x, y, z)
-#            con_x, con_y, con_z = find_target_coords(grid_map, tar_block, obx, oby, obz)
-
-        if world_state.number_of_observations_since_last_state > 0:
-            obvsText = world_state.observations[-1].text
-            data = json.loads(obvsText) # observation comes in as a JSON string...
-            if pitch is not None and point_to(agent_host, data, pitch, yaw, 0.1) and count > 0:
-                count -= 1
-                agent_host.sendCommand('use 1')
-                print('Shooting...')
-                time.sleep(f)
-                print('Shot...')
-                agent_host.sendCommand('use 0')
-
-        time.sleep(0.1)
-        world_state = agent_host.getWorldState()
-        for error in world_state.errors:
-            print("Error:",error.text)
-
-    print()
-    print("Mission ended")
-
+            print("Error starting mission:",e)
+            exit(1)
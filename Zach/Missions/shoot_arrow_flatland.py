@@ -23,7 +23,13 @@ from __future__ import print_function
 from builtins import range
 from past.utils import old_div
 from util.targeting import pitch_yaw_force
-from util.targeting import point_to
+from util.movement import AimController
+from util.runner import AgentRunner
+from util.runner import draw_force
+from util.observations import Observation
+from util.spans import SpanRecorder
+from util.spans import print_summary
+from util.spans import span
 
 import MalmoPython
 import os
@@ -106,6 +112,8 @@ if agent_host.receivedArgument("help"):
     exit(0)
 
 # Continually do the mission
+runner = AgentRunner(agent_host)
+recorder = SpanRecorder().activate()
 while True:
     x = random.randint(-25, 25)
     y = 4
@@ -118,57 +126,44 @@ while True:
     my_mission = MalmoPython.MissionSpec(missionXML, True)
     my_mission_record = MalmoPython.MissionRecordSpec()
 
-    # Attempt to start a mission:
-    max_retries = 3
-    for retry in range(max_retries):
-        try:
-            agent_host.startMission( my_mission, my_mission_record )
-            break
-        except RuntimeError as e:
-            if retry == max_retries - 1:
-                print("Error starting mission:",e)
-                exit(1)
-            else:
-                time.sleep(2)
-
-    # Loop until mission starts:
+    # Attempt to start a mission and wait for it to begin:
     print("Waiting for the mission to start ", end=' ')
-    world_state = agent_host.getWorldState()
-    while not world_state.has_mission_begun:
-        print(".", end="")
-        time.sleep(0.1)
-        world_state = agent_host.getWorldState()
-        for error in world_state.errors:
-            print("Error:",error.text)
+    try:
+        runner.start_mission(my_mission, my_mission_record)
+    except RuntimeError as e:
+        print("Error starting mission:",e)
+        exit(1)
 
     print()
     print("Mission running ", end=' ')
 
-    # Loop until mission ends:
+    # Handle each new observation until mission ends:
     count = 1
     grid = None
-    while world_state.is_mission_running:
+    aim = AimController(turn_speed=180, threshold=0.1)
+    for world_state in runner.world_states():
         if world_state.observations and grid is None:
             tar_block = 'diamond_block'
-            obvsCube = world_state.observations[0].text
-            grid = json.loads(obvsCube)
-            grid_map = grid['Map']
-            tar_pitch, tar_yaw, f = pitch_yaw_force(tar_block, grid_map, obx, oby, obz)
+            with span('grid_parse'):
+                obvsCube = world_state.observations[0].text
+                grid = json.loads(obvsCube)
+                grid_map = grid['Map']
+            with span('targeting'):
+                tar_pitch, tar_yaw, f = pitch_yaw_force(tar_block, grid, obx, oby, obz, tar_block)
 
         if world_state.number_of_observations_since_last_state > 0:
             obvsText = world_state.observations[-1].text
-            data = json.loads(obvsText) # observation comes in as a JSON string...
-            if tar_pitch is not None and point_to(agent_host, data, tar_pitch, tar_yaw, 0.1) and count > 0:
+            data = Observation(obvsText) # only the stats are parsed, not the grid
+            if tar_pitch is not None and aim.update(runner, data, tar_pitch, tar_yaw) and count > 0:
                 count -= 1
-                agent_host.sendCommand('use 1')
-                time.sleep(f)
-                agent_host.sendCommand('use 0')
-
-        time.sleep(0.1)
-        world_state = agent_host.getWorldState()
-        for error in world_state.errors:
-            print("Error:",error.text)
+                runner.draw_bow(f, lambda drawn: recorder.shot(shot=True, pitch=tar_pitch, yaw=tar_yaw,
+                                                               f=draw_force(drawn), planned_f=f))
 
     print()
     print("Mission ended")
+    print("Observation to command latency (ms):", runner.latency_summary())
+    print("Time to aim (ms):", aim.aim_summary())
+    if recorder.stages:
+        recorder.shot(shot=False)
+    print_summary(recorder.summary())
 
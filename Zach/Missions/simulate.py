@@ -0,0 +1,47 @@
+from __future__ import print_function
+
+# Run a mission script on the headless stand-in for Minecraft, e.g.
+#
+#   python simulate.py --missions 20 shoot_arrow.py
+#   python simulate.py --missions 20 shoot_arrow.py --ports 10000,10001,10002
+#   python simulate.py --missions 5 shoot_arrow_flatland.py
+#
+# The script runs unchanged with util.headless imported as MalmoPython.
+# Each agent stops after --missions and the totals of every agent are
+# printed, including how much faster than real time the missions ran.
+
+import argparse
+import runpy
+import sys
+
+from util import headless
+
+
+def totals():
+    """
+    The summaries of every simulated agent host that ran a mission, added up.
+    """
+    summaries = [host.summary() for host in headless.hosts if host.missions]
+    total = {'agents': len(summaries), 'missions': sum(s['missions'] for s in summaries),
+             'shots': sum(s['shots'] for s in summaries), 'hits': sum(s['hits'] for s in summaries),
+             'simulated': sum(s['simulated'] for s in summaries),
+             'wall': max([s['wall'] for s in summaries] or [0])}
+    total['speedup'] = total['simulated'] / max(total['wall'], 1e-9)
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a mission script without Minecraft.')
+    parser.add_argument('--missions', type=int, default=10, help='Missions to run per agent.')
+    parser.add_argument('script', help='The mission script, e.g. shoot_arrow.py.')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Arguments for the script.')
+    args = parser.parse_args()
+
+    headless.AgentHost.max_missions = args.missions
+    sys.modules['MalmoPython'] = headless
+    sys.argv = [args.script] + args.args
+    try:
+        runpy.run_path(args.script, run_name='__main__')
+    except headless.MissionLimit:
+        pass
+    print('Simulated', totals())
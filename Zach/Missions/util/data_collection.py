@@ -1,17 +1,276 @@
 
+import atexit
 import csv
+import numbers
+import os
+import threading
+import numpy as np
+
+
+class RecordWriter(object):
+    """
+    Keeps a CSV file of training records open and writes the rows in
+    batches instead of opening the file for every row. Numbers are written
+    unquoted and missing values (None) are written as nan, so the files
+    load straight into numeric columns. Writes are locked, so agents in
+    different threads can share a writer.
+
+    input:
+        filename (str) - The CSV file to append the records to.
+
+        batch_size (int) - How many rows to buffer before writing them.
+    """
+
+    def __init__(self, filename, batch_size=500):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.rows = []
+        self.lock = threading.RLock()
+        self.file = open(filename, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+    def write(self, row):
+        row = [to_number(value) for value in row]
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.rows:
+                self.writer.writerows(self.rows)
+                self.rows = []
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.flush()
+                self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def to_number(value):
+    """
+    Convert a value to a plain int or float for writing, with None
+    becoming nan.
+    """
+    if value is None:
+        return float('nan')
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    return float(value)
+
+
+# One open writer per file, shared by every call to save_data and save_labels.
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(filename, batch_size=500):
+    """
+    Get the shared RecordWriter for a file, opening it if needed.
+    """
+    with _writers_lock:
+        if filename not in _writers:
+            _writers[filename] = RecordWriter(filename, batch_size)
+        return _writers[filename]
+
+
+def flush_records():
+    """
+    Write out every buffered record, e.g. at the end of a mission.
+    """
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+@atexit.register
+def close_records():
+    """
+    Write out every buffered record and close the files.
+    """
+    for writer in _writers.values():
+        writer.close()
+    _writers.clear()
+
 
 def save_data(tx, ty, tz, obs, filename='data/data.csv'):
     data = [tx, ty, tz]
     for ob in obs:
         data.append(ob[1][0])
         data.append(ob[1][1])
-
-    with open(filename, 'a', newline='') as f_data:
-        wr = csv.writer(f_data, quoting=csv.QUOTE_ALL)
-        wr.writerow(data)
+    get_writer(filename).write(data)
 
 def save_labels(pitch, yaw, f, filename='data/labels.csv'):
-    with open(filename, 'a', newline='') as f_labels:
-        wr = csv.writer(f_labels, quoting=csv.QUOTE_ALL)
-        wr.writerow([pitch, yaw, f])
+    get_writer(filename).write([pitch, yaw, f])
+
+
+# Held while a sample's data and labels are written, so agents in different
+# threads can't interleave the rows of the two files.
+_record_lock = threading.Lock()
+
+
+def save_record(tx, ty, tz, obs, pitch, yaw, f, data_file='data/data.csv', label_file='data/labels.csv'):
+    """
+    Save a sample's data and labels together, so row i of the data file is
+    always labelled by row i of the label file. See save_data and
+    save_labels.
+    """
+    with _record_lock:
+        save_data(tx, ty, tz, obs, data_file)
+        save_labels(pitch, yaw, f, label_file)
+
+
+def write_dataset(path, targets, obstacles, offsets, labels=None):
+    """
+    Save trajectory samples in a columnar binary layout that can be memory
+    mapped. Every sample has a variable number of obstacles, so they are
+    stored back to back in one array with offsets marking where each
+    sample's obstacles start and end.
+
+    input:
+        path (str) - Directory to write the dataset into. Each array is
+                     saved as its own .npy file.
+
+        targets (array) - (N, 3) array of the target tx, ty, tz.
+
+        obstacles (array) - (M, 2) array of every obstacle's (dist, height).
+
+        offsets (array) - (N+1,) array where the obstacles of sample i are
+                          obstacles[offsets[i]:offsets[i+1]].
+
+        labels (array) - (N, 3) array of pitch, yaw, f. Optional.
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, 'targets.npy'), np.asarray(targets, dtype=float))
+    np.save(os.path.join(path, 'obstacles.npy'), np.asarray(obstacles, dtype=float).reshape(-1, 2))
+    np.save(os.path.join(path, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+    if labels is not None:
+        np.save(os.path.join(path, 'labels.npy'), np.asarray(labels, dtype=float))
+
+
+def read_dataset(path, mmap=True):
+    """
+    Load a dataset saved with write_dataset.
+
+    input:
+        path (str) - Directory the dataset was written to.
+
+        mmap (bool) - If the arrays should be memory mapped instead of
+                      read into memory.
+
+    output:
+        A dict with 'targets', 'obstacles', 'offsets' and, if they were
+        saved, 'labels'. See write_dataset.
+    """
+    mode = 'r' if mmap else None
+    dataset = {}
+    for name in ('targets', 'obstacles', 'offsets', 'labels'):
+        filename = os.path.join(path, name + '.npy')
+        if os.path.exists(filename):
+            dataset[name] = np.load(filename, mmap_mode=mode)
+    return dataset
+
+
+def rows_to_dataset(rows):
+    """
+    Pack ragged rows of [tx, ty, tz, dist_0, height_0, dist_1, ...] into the
+    arrays write_dataset takes. Rows with fewer than three values get nan
+    targets and no obstacles.
+
+    output:
+        A tuple of (targets, obstacles, offsets).
+    """
+    targets = np.full((len(rows), 3), np.nan)
+    counts = np.zeros(len(rows), dtype=np.int64)
+    flat = []
+    for i, row in enumerate(rows):
+        if len(row) < 3:
+            continue
+        targets[i] = row[:3]
+        pairs = row[3:3 + (len(row) - 3) // 2 * 2]
+        counts[i] = len(pairs) // 2
+        flat.extend(pairs)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return targets, np.asarray(flat, dtype=float).reshape(-1, 2), offsets
+
+
+def read_rows(filename, header=False):
+    """
+    Read ragged rows of numbers from one of the existing text datasets.
+    Both the tab separated .txt files and the quoted .csv files from
+    save_data and save_labels are understood. Empty fields at the end of a
+    row are dropped, any other empty or 'None' field is read as nan.
+    """
+    rows = []
+    with open(filename, newline='') as f:
+        if filename.endswith('.csv'):
+            lines = csv.reader(f)
+        else:
+            lines = (line.split() for line in f)
+        if header:
+            next(lines, None)
+        for line in lines:
+            while line and line[-1] == '':
+                line = line[:-1]
+            rows.append([float('nan') if v in ('', 'None') else float(v) for v in line])
+    return rows
+
+
+def convert_dataset(data_file, label_file, path, header=False, drop=()):
+    """
+    Convert an existing text dataset (e.g. data/1k_data.txt and
+    data/1k_labels.txt, or a data.csv/labels.csv pair) into the binary
+    layout of write_dataset. Rows are kept in the same order as the files.
+
+    input:
+        data_file (str) - The file of [tx, ty, tz, dist, height, ...] rows.
+
+        label_file (str) - The file of [pitch, yaw, f] rows, or None.
+
+        path (str) - Directory to write the dataset into.
+
+        header (bool) - If the files start with a header row.
+
+        drop (list) - Indexes of data rows that have no label, e.g. 1k_data.txt
+                      has one more row than 1k_labels.txt and neural_net.py
+                      drops row 85 to line them up.
+    """
+    drop = set(drop)
+    rows = [row for i, row in enumerate(read_rows(data_file, header)) if i not in drop]
+    targets, obstacles, offsets = rows_to_dataset(rows)
+    labels = None
+    if label_file is not None:
+        # An unhittable label was saved as pitch and f of None, which the
+        # old writer left empty, so pad rows that lost their trailing f.
+        rows = read_rows(label_file, header)
+        labels = np.array([row + [np.nan] * (3 - len(row)) for row in rows])
+        if len(labels) != len(targets):
+            raise ValueError(str(len(targets)) + ' data rows but ' + str(len(labels)) + ' labels, pass the '
+                             'data rows without a label as drop')
+    write_dataset(path, targets, obstacles, offsets, labels)
+
+
+if __name__ == '__main__':
+    # Convert a text dataset, e.g.
+    #   python -m util.data_collection data/1k_data.txt data/1k_labels.txt data/1k_dataset --drop 85
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert a text dataset to the binary layout of write_dataset.')
+    parser.add_argument('data')
+    parser.add_argument('labels')
+    parser.add_argument('path')
+    parser.add_argument('--header', action='store_true', help='If the files start with a header row.')
+    parser.add_argument('--drop', nargs='+', type=int, default=[], help='Data rows without a label.')
+    args = parser.parse_args()
+    convert_dataset(args.data, args.labels, args.path, args.header, args.drop)
@@ -0,0 +1,194 @@
+
+import os
+import numpy as np
+
+from util.grid_observer_parse import VoxelGrid
+from util.grid_observer_parse import encode_grid
+from util.synthetic import random_grid
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'fixtures')
+
+
+def save_fixture(filename, grid, obx, oby):
+    """
+    Save a grid observation so it can be replayed without Minecraft, e.g.
+    to benchmark the targeting on it. Record with the largest obx you want
+    to replay, smaller grids are cropped out of it by load_fixture.
+
+    input:
+        filename (str) - The .npz file to write.
+
+        grid (dict) - The grid observation, with 'Map' as the list from
+                      json.loads or a VoxelGrid, and 'XPos', 'YPos' and
+                      'ZPos'.
+
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player.
+
+        oby (int) - The observation distance from the player to the heighest
+                    y point.
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    grid_map = encode_grid(grid['Map'], obx, oby)
+    np.savez_compressed(filename, blocks=grid_map.blocks, palette=np.array(grid_map.palette),
+                        pos=np.array([grid['XPos'], grid['YPos'], grid['ZPos']]),
+                        obx=obx, oby=oby)
+
+
+def load_fixture(filename, obx=None):
+    """
+    Load a grid observation saved by save_fixture.
+
+    input:
+        filename (str) - The .npz file, or the name of one in FIXTURE_DIR.
+
+        obx (int) - Crop the grid to this distance from the player, None
+                    to keep the whole grid. It can't be bigger than the
+                    recorded grid.
+
+    output:
+        A dict shaped like a parsed grid observation, with 'Map' as a
+        VoxelGrid, the player's 'XPos', 'YPos' and 'ZPos', and the 'obx'
+        and 'oby' of the grid.
+    """
+    if not os.path.exists(filename):
+        filename = os.path.join(FIXTURE_DIR, filename + '.npz')
+    with np.load(filename) as f:
+        grid = {'Map': VoxelGrid(f['blocks'], f['palette'].tolist()),
+                'XPos': float(f['pos'][0]), 'YPos': float(f['pos'][1]), 'ZPos': float(f['pos'][2]),
+                'obx': int(f['obx']), 'oby': int(f['oby'])}
+    if obx is not None:
+        grid = crop_grid(grid, obx)
+    return grid
+
+
+def crop_grid(grid, obx):
+    """
+    Crop a grid observation to a smaller distance from the player, the same
+    grid a mission with that obx would see.
+    """
+    if obx > grid['obx']:
+        raise ValueError('Can not crop a grid with obx ' + str(grid['obx']) + ' to ' + str(obx))
+    c = grid['obx']
+    blocks = grid['Map'].blocks[:, c-obx:c+obx+1, c-obx:c+obx+1]
+    return dict(grid, Map=VoxelGrid(np.ascontiguousarray(blocks), list(grid['Map'].palette)), obx=obx)
+
+
+def list_fixtures(directory=FIXTURE_DIR):
+    """
+    The names of the fixtures in a directory, for load_fixture.
+    """
+    if not os.path.exists(directory):
+        return []
+    return sorted(name[:-4] for name in os.listdir(directory) if name.endswith('.npz'))
+
+
+def draw_tower(blocks, palette, obx, oby, dx, dy, dz):
+    """
+    Draw a target the way the mission XML does, two redstone blocks with a
+    diamond block on top, at (dx, dy, dz) from the player's feet. The
+    column under it is filled down to the ground so it doesn't float.
+    """
+    ax, az = obx + dx, obx + dz
+    base = oby + dy
+    air = palette.index('air')
+    below = base - 1
+    while below >= 0 and blocks[below, az, ax] == air:
+        blocks[below, az, ax] = palette.index('dirt')
+        below -= 1
+    blocks[base:base+2, az, ax] = palette.index('redstone_block')
+    blocks[base+2, az, ax] = palette.index('diamond_block')
+
+
+def diamond_grid(player, towers, obx=50, oby=10, seed=0):
+    """
+    Reconstruct the grid of the DefaultWorldGenerator missions. The terrain
+    is from util.synthetic, since the seeded world can only be observed
+    with Minecraft, and the towers are drawn at the mission XML's absolute
+    coordinates.
+
+    input:
+        player (tuple) - The player's absolute (x, y, z).
+
+        towers (list) - The absolute (x, y, z) of the bottom of each tower,
+                        the first DrawLine of the XML.
+
+    output:
+        A grid observation dict like load_fixture's.
+    """
+    grid = random_grid(obx, oby, np.random.default_rng(seed), targets=0)
+    blocks, palette = grid['Map'].blocks, grid['Map'].palette
+    for x, y, z in towers:
+        draw_tower(blocks, palette, obx, oby, x - player[0], y - player[1], z - player[2])
+    return {'Map': grid['Map'], 'XPos': player[0] + 0.5, 'YPos': float(player[1]),
+            'ZPos': player[2] + 0.5, 'obx': obx, 'oby': oby}
+
+
+def flatland_grid(player, obx=50, oby=10, seed=0, houses=8):
+    """
+    Reconstruct the grid of the flatland village mission: the
+    '3;minecraft:bedrock,2*minecraft:dirt,minecraft:grass;1;village' layers,
+    houses of cobblestone and planks along gravel paths, and the tower at
+    (0, 4, 0).
+
+    input:
+        player (tuple) - The player's absolute (x, y, z), y is 4 on the
+                         grass.
+
+        houses (int) - How many houses to place.
+
+    output:
+        A grid observation dict like load_fixture's.
+    """
+    palette = ['air', 'bedrock', 'dirt', 'grass', 'gravel', 'cobblestone', 'planks', 'glass_pane',
+               'redstone_block', 'diamond_block']
+    ids = dict((name, i) for i, name in enumerate(palette))
+    rng = np.random.default_rng(seed)
+    s = 2*obx+1
+    blocks = np.zeros((2*oby+1, s, s), dtype=np.uint8)
+    for y, name in enumerate(['bedrock', 'dirt', 'dirt', 'grass']):
+        ay = oby + y - player[1]
+        if 0 <= ay < 2*oby+1:
+            blocks[ay] = ids[name]
+
+    ground = oby + 3 - player[1]
+    tower = (obx - player[0], obx - player[2])
+    # A cross of gravel paths through the village with houses around it.
+    cx, cz = rng.integers(obx - obx//2, obx + obx//2 + 1, 2)
+    blocks[ground, cz-1:cz+2, :] = ids['gravel']
+    blocks[ground, :, cx-1:cx+2] = ids['gravel']
+    for _ in range(houses):
+        w, d = rng.integers(5, 8, 2)
+        x0, z0 = rng.integers(0, s - 7, 2)
+        if any(x0 <= x < x0 + w and z0 <= z < z0 + d for x, z in [(obx, obx), tower]):
+            continue
+        top = min(ground + rng.integers(4, 6), 2*oby)
+        house = blocks[ground+1:top+1, z0:z0+d, x0:x0+w]
+        house[:] = ids['cobblestone']
+        house[:-1, 1:-1, 1:-1] = ids['air']
+        house[-1] = ids['planks']
+        house[1:3, d//2, [0, -1]] = ids['glass_pane']
+        house[:2, 0, w//2] = ids['air']
+
+    draw_tower(blocks, palette, obx, oby, -player[0], 4 - player[1], -player[2])
+    return {'Map': VoxelGrid(blocks, palette), 'XPos': player[0] + 0.5, 'YPos': float(player[1]),
+            'ZPos': player[2] + 0.5, 'obx': obx, 'oby': oby}
+
+
+def make_fixtures(directory=FIXTURE_DIR, obx=50, oby=10):
+    """
+    Write the reconstructed mission grids to directory. diamonds_start is
+    the start of shoot_arrow.py, diamonds_spawn a spawn find_con_spawn
+    could pick around the first tower, and flatland_village a spawn of
+    shoot_arrow_flatland.py.
+    """
+    towers = [(235, 78, 315), (235, 77, 346)]
+    fixtures = {'diamonds_start': diamond_grid((243, 76, 323), towers, obx, oby, seed=2),
+                'diamonds_spawn': diamond_grid((228, 77, 321), towers, obx, oby, seed=3),
+                'flatland_village': flatland_grid((8, 4, -6), obx, oby, seed=1)}
+    for name, grid in fixtures.items():
+        save_fixture(os.path.join(directory, name + '.npz'), grid, obx, oby)
+    return sorted(fixtures)
@@ -1,4 +1,64 @@
 
+import numpy as np
+
+from collections import namedtuple
+
+
+# A grid observation stored as a 3-D array of block ids, indexed by
+# [ay, az, ax], along with the palette of block names for those ids.
+VoxelGrid = namedtuple('VoxelGrid', ['blocks', 'palette'])
+
+
+def encode_grid(obs_map, obx, oby):
+    """
+    Encode the map from a grid observation as integers. Each distinct
+    block name gets an id in a palette and the map becomes a 3-D numpy
+    array of those ids. This is about an eighth of the memory of the list
+    of strings and lets block comparisons be done on whole arrays. Every
+    helper in this module and util.targeting that takes an obs_map also
+    takes a VoxelGrid.
+
+    input:
+        obs_map (list) - map from grid['Map'] from a grid observation,
+                         or a VoxelGrid from encode_grid.
+
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player. Ex. If the player
+                    is in the center of a 51 meter cube
+                    the obx will be 25.
+
+        oby (int) - The observation distance from the player to the heighest
+                    y point.
+
+    output:
+        A VoxelGrid of (blocks, palette). blocks is a uint8 array (uint16
+        if there are more than 256 kinds of blocks) shaped
+        (2*oby+1, 2*obx+1, 2*obx+1) and palette is a list of block names.
+    """
+    if isinstance(obs_map, VoxelGrid):
+        return obs_map
+    s = 2*obx+1
+    palette, ids = np.unique(np.asarray(obs_map), return_inverse=True)
+    dtype = np.uint8 if len(palette) <= 256 else np.uint16
+    return VoxelGrid(ids.astype(dtype).reshape(2*oby+1, s, s), palette.tolist())
+
+
+def decode_grid(grid):
+    """
+    Turn a VoxelGrid back into the flat list of block names that
+    grid['Map'] holds.
+    """
+    return [grid.palette[i] for i in grid.blocks.ravel()]
+
+
+def block_ids(grid, names):
+    """
+    Get the ids of the given block names in a VoxelGrid's palette.
+    Names that aren't in the palette are skipped.
+    """
+    return [grid.palette.index(name) for name in names if name in grid.palette]
+
+
 def get_block(obs_map, s, ax, ay, az):
     """
     Determine the specific block at the given x, y, z. These coordinates
@@ -6,7 +66,8 @@ def get_block(obs_map, s, ax, ay, az):
     xz grid is 0, 0. Remember the xz grid must be square.
 
     input:
-        obs_map (list) - map from grid['Map'] from a grid observation.
+        obs_map (list) - map from grid['Map'] from a grid observation,
+                         or a VoxelGrid from encode_grid.
 
         s (int) - The size of one side of an xz grid. This is 2*obx+1,
                   where obx is the observation distance of the x 
@@ -26,20 +87,74 @@ def get_block(obs_map, s, ax, ay, az):
     if ax < 0 or ay < 0 or az < 0:
         raise ValueError("Absolute Coords cannot be negative! Did you "
                          "accidentally use relative coordinates?")
+    if isinstance(obs_map, VoxelGrid):
+        return obs_map.palette[obs_map.blocks[ay, az, ax]]
     pos = ay*(s**2)
     pos += ax
     pos += az*s
     return obs_map[pos]
 
 
-def get_nonair_y(obs_map, obx, oby, ax, az):
+def get_heightmaps(obs_map, obx, oby):
+    """
+    Find the surface of every xz column of a grid observation in one pass.
+    This gives the same answers as get_nonair_y and get_solid_y for every
+    column at once, so those become array lookups instead of scanning
+    each column from the top block by block.
+
+    input:
+        obs_map (list) - map from grid['Map'] from a grid observation,
+                         or a VoxelGrid from encode_grid.
+
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player. Ex. If the player
+                    is in the center of a 51 meter cube
+                    the obx will be 25.
+
+        oby (int) - The observation distance from the player to the heighest
+                    y point.
+
+    output:
+        A tuple of (nonair_y, solid_y, liquid). Each is a numpy array shaped
+        (2*obx+1, 2*obx+1) and indexed by the absolute [ax, az] coordinates.
+
+        nonair_y - The relative y coordinate of the first non-air block,
+                   nan if there isn't one.
+
+        solid_y - The relative y coordinate of the first solid block,
+                  nan if there isn't one or the top block is water or lava.
+
+        liquid - True where the top non-air block is water or lava.
+    """
+    s = 2*obx+1
+    if isinstance(obs_map, VoxelGrid):
+        blocks = obs_map.blocks[1:]
+        nonair = ~np.isin(blocks, block_ids(obs_map, ['air']))
+        is_liquid = np.isin(blocks, block_ids(obs_map, ['water', 'lava']))
+    else:
+        blocks = np.asarray(obs_map).reshape(2*oby+1, s, s)[1:]
+        nonair = blocks != 'air'
+        is_liquid = (blocks == 'water') | (blocks == 'lava')
+
+    # Like the column scans the lowest layer (ay = 0) is never checked.
+    top = 2*oby - np.argmax(nonair[::-1], axis=0)
+    found = nonair.any(axis=0)
+    liquid = found & np.take_along_axis(is_liquid, top[None] - 1, axis=0)[0]
+
+    nonair_y = np.where(found, top - oby + 1, np.nan)
+    solid_y = np.where(liquid, np.nan, nonair_y)
+    return nonair_y.T, solid_y.T, liquid.T
+
+
+def get_nonair_y(obs_map, obx, oby, ax, az, heights=None):
     """
     Get the first non-air y coordinate using the absolute x and
     z coordinates. These coordinates are measured from the top left
     hand corner of the grid observert.
 
     input:
-        obs_map (list) - map from grid['Map'] from a grid observation.
+        obs_map (list) - map from grid['Map'] from a grid observation,
+                         or a VoxelGrid from encode_grid.
 
         obx (int) - The distance to the edge of the x axis
                     grid from the player. Ex. If the player
@@ -53,10 +168,16 @@ def get_nonair_y(obs_map, obx, oby, ax, az):
 
         z (int) - The absolute z coordinate of the block to check.
 
+        heights (tuple) - The heightmaps from get_heightmaps. If given the
+                          y coordinate is looked up instead of scanned.
+
     output:
         An integer which is the relative y coordinate to the player.
         None otherwise.
     """   
+    if heights is not None:
+        y = heights[0][ax, az]
+        return None if np.isnan(y) else int(y)
     for ay in range(2*oby, 0, -1):
         block = get_block(obs_map, 2*obx+1, ax, ay, az)
         if block != 'air':       
@@ -64,14 +185,15 @@ def get_nonair_y(obs_map, obx, oby, ax, az):
     return None
 
 
-def get_solid_y(obs_map, obx, oby, ax, az):
+def get_solid_y(obs_map, obx, oby, ax, az, heights=None):
     """
     Get the first solid block y coordinate using the absolute x and
     z coordinates. These coordinates are measured from the top left
     hand corner of the grid observert.
 
     input:
-        obs_map (list) - map from grid['Map'] from a grid observation.
+        obs_map (list) - map from grid['Map'] from a grid observation,
+                         or a VoxelGrid from encode_grid.
 
         obx (int) - The distance to the edge of the x axis
                     grid from the player. Ex. If the player
@@ -85,10 +207,16 @@ def get_solid_y(obs_map, obx, oby, ax, az):
 
         az (int) - The absolute z coordinate of the block to check.
 
+        heights (tuple) - The heightmaps from get_heightmaps. If given the
+                          y coordinate is looked up instead of scanned.
+
     output:
         An integer which is the relative y coordinate to the player.
         This will return None if there is not a suitable block.
     """   
+    if heights is not None:
+        y = heights[1][ax, az]
+        return None if np.isnan(y) else int(y)
     for ay in range(2*oby, 0, -1):
         block = get_block(obs_map, 2*obx+1, ax, ay, az)
         if block == 'water' or block == 'lava':
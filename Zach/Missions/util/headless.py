@@ -0,0 +1,490 @@
+from __future__ import print_function
+
+# A stand-in for MalmoPython that runs missions without Minecraft. It reads
+# the same mission XML, builds the world from the generator and
+# DrawingDecorator, turns the agent with ContinuousMovementCommands, draws
+# the bow with 'use' and flies the arrows with sim_shot's physics. Time is
+# simulated: it only passes when the agent sleeps, so missions run as fast
+# as the agent can think. Use it in place of the real module, e.g.
+#
+#   sys.modules['MalmoPython'] = util.headless
+#
+# or see simulate.py.
+
+import json
+import math
+import threading
+import time
+import numpy as np
+import xml.etree.ElementTree as ET
+
+from util.runner import draw_force
+
+
+NS = '{http://ProjectMalmo.microsoft.com}'
+TICK = 0.05
+# How far from the agent the world is built, arrows leaving it miss.
+REACH = 64
+DEPTH = 32
+
+# Every AgentHost made, for totals over a whole run.
+hosts = []
+_hosts_lock = threading.Lock()
+
+
+class MissionLimit(SystemExit):
+    """
+    Raised by startMission once an AgentHost has run max_missions, to stop
+    scripts that run missions forever. It's a SystemExit so the scripts'
+    'except RuntimeError' doesn't catch it.
+    """
+
+
+class SimClock(object):
+    """
+    Simulated time, starting at the wall clock time it was made. sleep
+    moves it forward instead of waiting.
+    """
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+class TimestampedString(object):
+
+    def __init__(self, timestamp, text):
+        self.timestamp = timestamp
+        self.text = text
+
+
+class WorldState(object):
+
+    def __init__(self, has_mission_begun=False, is_mission_running=False, observations=None,
+                 number_of_observations_since_last_state=0):
+        self.has_mission_begun = has_mission_begun
+        self.is_mission_running = is_mission_running
+        self.observations = observations or []
+        self.number_of_observations_since_last_state = number_of_observations_since_last_state
+        self.number_of_rewards_since_last_state = 0
+        self.number_of_video_frames_since_last_state = 0
+        self.rewards = []
+        self.video_frames = []
+        self.errors = []
+
+
+class MissionSpec(object):
+
+    def __init__(self, xml='', validate=True):
+        self.xml = xml
+
+    def getAsXML(self, pretty_print=False):
+        return self.xml
+
+
+class MissionRecordSpec(object):
+
+    def __init__(self, destination=''):
+        self.destination = destination
+
+    def recordMP4(self, *args):
+        pass
+
+    def recordRewards(self):
+        pass
+
+    def recordObservations(self):
+        pass
+
+    def recordCommands(self):
+        pass
+
+
+class ClientInfo(object):
+
+    def __init__(self, ip_address='127.0.0.1', port=10000):
+        self.ip_address = ip_address
+        self.port = port
+
+
+class ClientPool(object):
+
+    def __init__(self):
+        self.clients = []
+
+    def add(self, client_info):
+        self.clients.append(client_info)
+
+
+class Mission(object):
+    """
+    The settings of a mission XML the simulator uses.
+    """
+
+    def __init__(self, xml):
+        root = ET.fromstring(xml)
+        self.time_limit = None
+        quit = root.find('.//' + NS + 'ServerQuitFromTimeUp')
+        if quit is not None:
+            self.time_limit = float(quit.get('timeLimitMs')) / 1000
+
+        self.layers = None
+        self.seed = 0
+        flat = root.find('.//' + NS + 'FlatWorldGenerator')
+        if flat is not None:
+            self.layers = flat_layers(flat.get('generatorString', '3;7,2*3,2;1;village'))
+        default = root.find('.//' + NS + 'DefaultWorldGenerator')
+        if default is not None and default.get('seed'):
+            self.seed = int(default.get('seed'))
+
+        self.drawing = []
+        decorator = root.find('.//' + NS + 'DrawingDecorator')
+        for shape in (decorator if decorator is not None else []):
+            self.drawing.append((shape.tag[len(NS):], dict(shape.attrib)))
+
+        placement = root.find('.//' + NS + 'Placement')
+        self.start = [float(placement.get(k, 0)) for k in ('x', 'y', 'z')] if placement is not None else [0.5, 4, 0.5]
+        self.yaw = float(placement.get('yaw', 0)) if placement is not None else 0.0
+        self.pitch = float(placement.get('pitch', 0)) if placement is not None else 0.0
+
+        self.arrows = 0
+        for item in root.iter(NS + 'InventoryItem'):
+            if item.get('type') == 'arrow':
+                self.arrows += int(item.get('quantity', 1))
+
+        self.grid = None
+        grid = root.find('.//' + NS + 'ObservationFromGrid/' + NS + 'Grid')
+        if grid is not None:
+            low, high = grid.find(NS + 'min'), grid.find(NS + 'max')
+            self.grid = (grid.get('name'), [int(low.get(k)) for k in 'xyz'], [int(high.get(k)) for k in 'xyz'])
+
+        turn = root.find('.//' + NS + 'ContinuousMovementCommands')
+        self.turn_speed = float(turn.get('turnSpeedDegs', 180)) if turn is not None else None
+
+
+def flat_layers(generator):
+    """
+    The block of each layer, bottom up, of a FlatWorldGenerator string like
+    '3;minecraft:bedrock,2*minecraft:dirt,minecraft:grass;1;village'.
+    """
+    layers = []
+    for layer in generator.split(';')[1].split(','):
+        count, _, name = layer.rpartition('*')
+        name = name.split(':')[-1]
+        layers += [name] * int(count or 1)
+    return layers
+
+
+class World(object):
+    """
+    The blocks around the agent's start, as ids into a palette indexed by
+    [y, z, x] from the corner (x0, y0, z0). Without a flat world the
+    terrain is smooth seeded hills around y 75, since the real seeded
+    world only exists in Minecraft.
+    """
+
+    def __init__(self, mission):
+        px, py, pz = (int(math.floor(v)) for v in mission.start)
+        self.x0, self.y0, self.z0 = px - REACH, max(py - DEPTH, 0), pz - REACH
+        size, height = 2*REACH+1, DEPTH + py - self.y0 + 1
+        self.palette = ['air']
+        self.blocks = np.zeros((height, size, size), dtype=np.uint8)
+
+        ys = np.arange(height)[:, None, None] + self.y0
+        if mission.layers is not None:
+            for y, name in enumerate(mission.layers):
+                if self.y0 <= y < self.y0 + height:
+                    self.blocks[y - self.y0] = self.id(name)
+        else:
+            rng = np.random.default_rng(mission.seed)
+            xs = np.arange(size)[None, :] + self.x0
+            zs = np.arange(size)[:, None] + self.z0
+            ground = np.full((size, size), 75.0)
+            for _ in range(6):
+                fx, fz = rng.uniform(0.02, 0.15, 2)
+                phase_x, phase_z = rng.uniform(0, 2*np.pi, 2)
+                ground += rng.uniform(0.5, 3) * np.sin(fx*xs + phase_x) * np.sin(fz*zs + phase_z)
+            ground = np.rint(ground)
+            self.blocks[ys < ground - 3] = self.id('stone')
+            self.blocks[(ys >= ground - 3) & (ys < ground)] = self.id('dirt')
+            self.blocks[ys == ground] = self.id('grass')
+
+        for shape, a in mission.drawing:
+            if shape == 'DrawBlock':
+                self.set(int(a['x']), int(a['y']), int(a['z']), a['type'])
+            elif shape == 'DrawCuboid':
+                for x in range(int(a['x1']), int(a['x2']) + 1):
+                    for y in range(int(a['y1']), int(a['y2']) + 1):
+                        for z in range(int(a['z1']), int(a['z2']) + 1):
+                            self.set(x, y, z, a['type'])
+            elif shape == 'DrawLine':
+                start = np.array([int(a['x1']), int(a['y1']), int(a['z1'])])
+                end = np.array([int(a['x2']), int(a['y2']), int(a['z2'])])
+                steps = int(np.abs(end - start).max())
+                for i in range(steps + 1):
+                    x, y, z = np.rint(start + (end - start) * (i / float(max(steps, 1)))).astype(int)
+                    self.set(x, y, z, a['type'])
+
+    def id(self, name):
+        if name not in self.palette:
+            self.palette.append(name)
+        return self.palette.index(name)
+
+    def set(self, x, y, z, name):
+        i, j, k = y - self.y0, z - self.z0, x - self.x0
+        if 0 <= i < self.blocks.shape[0] and 0 <= j < self.blocks.shape[1] and 0 <= k < self.blocks.shape[2]:
+            self.blocks[i, j, k] = self.id(name)
+
+    def get(self, x, y, z):
+        i, j, k = int(math.floor(y)) - self.y0, int(math.floor(z)) - self.z0, int(math.floor(x)) - self.x0
+        if 0 <= i < self.blocks.shape[0] and 0 <= j < self.blocks.shape[1] and 0 <= k < self.blocks.shape[2]:
+            return self.palette[self.blocks[i, j, k]]
+        return 'air'
+
+    def land(self, x, y, z):
+        """
+        Where the agent ends up when put at (x, y, z): pushed up out of any
+        block it's in, then dropped onto the ground.
+        """
+        y = math.floor(y)
+        while self.get(x, y, z) != 'air' and y < self.y0 + self.blocks.shape[0]:
+            y += 1
+        while y > self.y0 and self.get(x, y - 1, z) == 'air':
+            y -= 1
+        return float(y)
+
+    def grid_text(self, x, y, z, low, high):
+        """
+        The JSON list of an ObservationFromGrid around the block at (x, y, z).
+        """
+        ax, ay, az = int(math.floor(x)), int(math.floor(y)), int(math.floor(z))
+        ys = np.arange(ay + low[1], ay + high[1] + 1) - self.y0
+        zs = np.arange(az + low[2], az + high[2] + 1) - self.z0
+        xs = np.arange(ax + low[0], ax + high[0] + 1) - self.x0
+        shape = self.blocks.shape
+        inside = ((ys >= 0) & (ys < shape[0]))[:, None, None] & \
+                 ((zs >= 0) & (zs < shape[1]))[None, :, None] & \
+                 ((xs >= 0) & (xs < shape[2]))[None, None, :]
+        ids = self.blocks[np.clip(ys, 0, shape[0] - 1)][:, np.clip(zs, 0, shape[1] - 1)][:, :, np.clip(xs, 0, shape[2] - 1)]
+        ids = np.where(inside, ids, 0)
+        names = np.array([json.dumps(name) for name in self.palette])
+        return '[' + ','.join(names[ids.ravel()]) + ']'
+
+
+def fly_arrow(world, x, y, z, pitch, yaw, v_o, max_ticks=1200):
+    """
+    Fly an arrow from the eyes of an agent at (x, y, z) with the physics of
+    sim_shot, 0.99 drag and 0.05 gravity per tick, until it enters a block.
+
+    output:
+        A tuple of the block it hit (None if it flew out of the world), the
+        (x, y, z) it stopped at and the ticks it flew for.
+    """
+    angle = math.radians(-pitch)
+    v_x, v_h = v_o * math.cos(angle), v_o * math.sin(angle)
+    dx, dz = -math.sin(math.radians(yaw)), math.cos(math.radians(yaw))
+    pos = np.array([x, y + 1.62, z])
+    for tick in range(1, max_ticks + 1):
+        step = np.array([v_x * dx, v_h, v_x * dz])
+        # Check the blocks along the step a quarter of a block at a time.
+        n = max(int(np.ceil(np.abs(step).max() * 4)), 1)
+        for i in range(1, n + 1):
+            p = pos + step * (i / float(n))
+            block = world.get(p[0], p[1], p[2])
+            if block != 'air':
+                return block, tuple(p), tick
+        pos = pos + step
+        v_x, v_h = v_x * 0.99, v_h * 0.99 - 0.05
+        if pos[1] < world.y0 or abs(pos[0] - x) > REACH or abs(pos[2] - z) > REACH:
+            break
+    return None, tuple(pos), tick
+
+
+class AgentHost(object):
+    """
+    A stand-in for MalmoPython.AgentHost that runs the mission in process.
+    Observations come every 50 ms tick of simulated time, with only the
+    latest kept like Malmo's default policy. The turn and pitch rates are
+    integrated exactly between commands. Each arrow is resolved when the
+    bow is released and recorded in shots.
+
+    input:
+        max_missions (int) - Raise MissionLimit on the start after this many
+                             missions, None to run forever.
+
+        load_time (float) - Simulated seconds before a mission begins.
+    """
+
+    max_missions = None
+
+    def __init__(self, max_missions=None, load_time=0.5):
+        if max_missions is not None:
+            self.max_missions = max_missions
+        self.load_time = load_time
+        self.clock = SimClock()
+        self.arguments = {}
+        self.flags = set()
+        self.received = set()
+        self.missions = 0
+        self.shots = []
+        self.mission = None
+        self.started_wall = time.time()
+        self.simulated = 0.0
+        with _hosts_lock:
+            hosts.append(self)
+
+    def addOptionalStringArgument(self, name, description, default):
+        self.arguments[name.split(',')[0]] = default
+
+    def addOptionalIntArgument(self, name, description, default):
+        self.arguments[name.split(',')[0]] = default
+
+    def addOptionalFlag(self, name, description):
+        self.flags.add(name.split(',')[0])
+
+    def parse(self, args):
+        args = list(args[1:])
+        while args:
+            arg = args.pop(0)
+            if not arg.startswith('-'):
+                continue
+            name = arg.lstrip('-')
+            self.received.add(name)
+            if name in self.arguments and args:
+                value = args.pop(0)
+                default = self.arguments[name]
+                self.arguments[name] = type(default)(value) if default is not None else value
+
+    def receivedArgument(self, name):
+        return name in self.received
+
+    def getStringArgument(self, name):
+        return self.arguments.get(name, '')
+
+    def getIntArgument(self, name):
+        return int(self.arguments.get(name, 0))
+
+    def getUsage(self):
+        return 'Headless agent host, arguments: ' + ', '.join(sorted(self.arguments) + sorted(self.flags))
+
+    def startMission(self, mission, *args):
+        if self.max_missions is not None and self.missions >= self.max_missions:
+            raise MissionLimit(0)
+        if self.mission is not None:
+            self.simulated += self.end - self.begin
+        self.missions += 1
+        self.mission = Mission(mission.xml)
+        self.world = World(self.mission)
+        x, y, z = self.mission.start
+        self.pos = (x, self.world.land(x, y, z), z)
+        self.pitch, self.yaw = self.mission.pitch, self.mission.yaw
+        self.turn_rate = self.pitch_rate = 0.0
+        self.arrows = self.mission.arrows
+        self.drawing_since = None
+        self.grid_text = None
+        if self.mission.grid is not None:
+            name, low, high = self.mission.grid
+            self.grid_text = '"' + name + '": ' + self.world.grid_text(self.pos[0], self.pos[1], self.pos[2], low, high)
+        self.begin = self.clock.time() + self.load_time
+        self.end = float('inf') if self.mission.time_limit is None else self.begin + self.mission.time_limit
+        self.moved = self.begin
+        self.last_tick = -1
+
+    def advance(self):
+        """
+        Turn the agent up to the current simulated time.
+        """
+        now = min(self.clock.time(), self.end)
+        if now > self.moved and self.mission.turn_speed is not None:
+            seconds = now - self.moved
+            self.yaw += self.turn_rate * self.mission.turn_speed * seconds
+            self.pitch = max(-90.0, min(90.0, self.pitch + self.pitch_rate * self.mission.turn_speed * seconds))
+        self.moved = max(self.moved, now)
+
+    def observation(self, tick):
+        stats = {'XPos': self.pos[0], 'YPos': self.pos[1], 'ZPos': self.pos[2], 'Pitch': self.pitch,
+                 'Yaw': self.yaw, 'Life': 20.0, 'IsAlive': True, 'Name': 'James Bond',
+                 'TimeAlive': tick, 'DistanceTravelled': 0}
+        text = json.dumps(stats)
+        if self.grid_text is not None:
+            text = text[:-1] + ', ' + self.grid_text + '}'
+        return TimestampedString(self.begin + tick * TICK, text)
+
+    def getWorldState(self):
+        if self.mission is None:
+            return WorldState()
+        now = self.clock.time()
+        if now < self.begin:
+            return WorldState()
+        self.advance()
+        tick = int((min(now, self.end) - self.begin) / TICK)
+        if now >= self.end:
+            return WorldState(has_mission_begun=True, is_mission_running=False)
+        new = tick - self.last_tick
+        self.last_tick = max(tick, self.last_tick)
+        if new <= 0:
+            return WorldState(True, True)
+        return WorldState(True, True, [self.observation(tick)], new)
+
+    def sendCommand(self, command):
+        if self.mission is None or not self.begin <= self.clock.time() < self.end:
+            return
+        self.advance()
+        verb, _, value = command.partition(' ')
+        value = float(value or 0)
+        if verb == 'turn':
+            self.turn_rate = max(-1.0, min(1.0, value))
+        elif verb == 'pitch':
+            self.pitch_rate = max(-1.0, min(1.0, value))
+        elif verb == 'use' and value:
+            self.drawing_since = self.clock.time()
+        elif verb == 'use' and self.drawing_since is not None:
+            self.release(self.clock.time() - self.drawing_since)
+            self.drawing_since = None
+
+    def release(self, drawn):
+        """
+        Shoot an arrow with the bow drawn for drawn seconds, the same force
+        as the f of the targeting, v_o = 2f + f^2.
+        """
+        f = draw_force(drawn)
+        # Minecraft doesn't shoot a bow drawn for less than a tenth of full power.
+        if self.arrows <= 0 or (f*f + 2*f) / 3 < 0.1:
+            return
+        self.arrows -= 1
+        block, stop, ticks = fly_arrow(self.world, self.pos[0], self.pos[1], self.pos[2], self.pitch,
+                                       self.yaw, 2*f + f**2)
+        self.shots.append({'mission': self.missions, 'f': f, 'pitch': self.pitch, 'yaw': self.yaw,
+                           'block': block, 'stop': stop, 'ticks': ticks,
+                           'hit': block == 'diamond_block'})
+
+    def summary(self):
+        """
+        Totals of the missions run so far.
+
+        output:
+            A dict of the 'missions', 'shots', 'hits', 'simulated' seconds of
+            the finished missions, 'wall' seconds and the 'speedup' of
+            simulated over wall time.
+        """
+        simulated = self.simulated
+        if self.mission is not None:
+            simulated += min(self.clock.time(), self.end) - self.begin
+        wall = max(time.time() - self.started_wall, 1e-9)
+        return {'missions': self.missions, 'shots': len(self.shots),
+                'hits': sum(s['hit'] for s in self.shots), 'simulated': float(simulated), 'wall': wall,
+                'speedup': float(simulated) / wall}
+
+
+def client_pool(port, host='127.0.0.1'):
+    """
+    The same as util.pool.client_pool, for run_pool's make_client_pool.
+    """
+    pool = ClientPool()
+    pool.add(ClientInfo(host, port))
+    return pool
@@ -0,0 +1,154 @@
+
+import json
+import re
+import numpy as np
+
+from util.grid_observer_parse import VoxelGrid
+
+
+# A JSON key with a number or boolean value. Grid entries are only strings,
+# so this never matches inside a grid.
+SCALAR = re.compile(r'"([^"]+)":\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false)')
+
+
+class Observation(object):
+    """
+    A lazily decoded observation. Reading the scalar stats, e.g. Pitch and
+    Yaw, only scans the text around the grid, and the grid itself is only
+    decoded when asked for. It can be used like the dict from json.loads
+    wherever only get or [] is used, e.g. point_to.
+
+    input:
+        text (str) - The observation's JSON text.
+
+        grid_name (str) - The name of the grid in the mission XML.
+    """
+
+    def __init__(self, text, grid_name='Map'):
+        self.text = text
+        self.grid_name = grid_name
+        self._stats = None
+        self._full = None
+        start = text.find('"' + grid_name + '":')
+        if start == -1:
+            self.grid_span = None
+        else:
+            self.grid_span = (start, text.index(']', start) + 1)
+
+    @property
+    def stats(self):
+        """
+        A dict of every number and boolean in the observation.
+        """
+        if self._stats is None:
+            if self.grid_span is None:
+                outside = self.text
+            else:
+                outside = self.text[:self.grid_span[0]] + self.text[self.grid_span[1]:]
+            self._stats = dict((key, json.loads(value)) for key, value in SCALAR.findall(outside))
+        return self._stats
+
+    def grid_text(self):
+        """
+        The raw JSON text of the grid list.
+        """
+        if self.grid_span is None:
+            return None
+        return self.text[self.text.index('[', self.grid_span[0]):self.grid_span[1]]
+
+    def grid(self):
+        """
+        The grid as the list of block names json.loads would give.
+        """
+        if self.grid_span is None:
+            return None
+        return json.loads(self.grid_text())
+
+    def json(self):
+        """
+        The whole observation decoded with json.loads.
+        """
+        if self._full is None:
+            self._full = json.loads(self.text)
+        return self._full
+
+    def get(self, key, default=None):
+        if key in self.stats:
+            return self.stats[key]
+        return self.json().get(key, default)
+
+    def __getitem__(self, key):
+        if key in self.stats:
+            return self.stats[key]
+        return self.json()[key]
+
+    def __contains__(self, key):
+        return key in self.stats or key in self.json()
+
+
+class GridTracker(object):
+    """
+    Keeps the encoded voxel array of a grid observation up to date. If the
+    grid text is the same as last time nothing is decoded. Otherwise the
+    whole grid is still decoded with json.loads and compared with the last
+    one, and only the encoding is incremental: the palette ids are looked
+    up for the blocks that changed and written into a copy of the last
+    array. The palette grows in the order blocks are first seen, so the
+    ids differ from encode_grid's sorted palette but stand for the same
+    blocks.
+
+    input:
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player.
+
+        oby (int) - The observation distance from the player to the heighest
+                    y point.
+    """
+
+    def __init__(self, obx, oby):
+        self.shape = (2*oby+1, 2*obx+1, 2*obx+1)
+        self.text = None
+        self.names = None
+        self.grid = None
+        self.palette = []
+        self.ids = {}
+
+    def update(self, ob):
+        """
+        Update the grid from an Observation or a grid['Map'] list.
+
+        output:
+            A VoxelGrid of the new grid. Grids returned before are left as
+            they were.
+        """
+        if isinstance(ob, Observation):
+            text = ob.grid_text()
+            if text is not None and text == self.text:
+                return self.grid
+            self.text = text
+            names = np.asarray(ob.grid())
+        else:
+            self.text = None
+            names = np.asarray(ob)
+
+        if self.names is None or self.names.shape != names.shape:
+            changed = np.ones(names.shape, dtype=bool)
+            blocks = np.zeros(names.size, dtype=np.uint8)
+        else:
+            changed = names != self.names
+            if not changed.any():
+                return self.grid
+            blocks = self.grid.blocks.ravel().copy()
+
+        new_names, inverse = np.unique(names[changed], return_inverse=True)
+        for name in new_names:
+            if name not in self.ids:
+                self.ids[name] = len(self.palette)
+                self.palette.append(str(name))
+        if len(self.palette) > 256 and blocks.dtype == np.uint8:
+            blocks = blocks.astype(np.uint16)
+        blocks[changed] = np.array([self.ids[name] for name in new_names], dtype=blocks.dtype)[inverse]
+
+        self.names = names
+        self.grid = VoxelGrid(blocks.reshape(self.shape), list(self.palette))
+        return self.grid
@@ -0,0 +1,193 @@
+
+import os
+import numpy as np
+
+from util.targeting import arc_height
+from util.targeting import sim_shots
+from util.targeting import solve_pitch
+
+
+def build_pitch_table(obx, oby, step=0.5, forces=None, tol=1e-3):
+    """
+    Build a lookup table of the pitch needed to hit a one block tall target
+    for every distance, height and force the player can observe. Each cell
+    is solved the same way as solve_pitch (bracketing with arc_height and
+    then bisecting), but every distance and height of a force is solved at
+    once with numpy. Obstacles are not part of the table.
+
+    input:
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player. Ex. If the player
+                    is in the center of a 51 meter cube
+                    the obx will be 25. Distances up to the
+                    corner of the grid (sqrt(2)*obx) are solved.
+
+        oby (int) - The observation distance from the player to the heighest
+                    y point. Heights from -oby to oby are solved.
+
+        step (float) - The spacing of the distance and height grid.
+
+        forces (array) - The forces to solve for. Defaults to the same
+                         forces find_pow_pitch tries, 1.0 down to 0.1.
+
+        tol (float) - How precise, in degrees, the pitches should be.
+
+    output:
+        A dict of numpy arrays. 'dists', 'heights' and 'forces' are the axes
+        of the table and 'low' and 'high' are the low arc and high arc pitches
+        shaped (forces, dists, heights). Unreachable cells are nan.
+    """
+    if forces is None:
+        forces = np.arange(1, 0, -0.1)
+    forces = np.asarray(forces, dtype=float)
+    dists = np.arange(0, np.sqrt(2) * obx + step, step)
+    heights = np.arange(-oby, oby + step, step)
+    angles = np.arange(-89, 90.5, 0.5)
+
+    # Aim for the middle of the window check_hit_ob accepts.
+    aims = heights + (0.25 + 1 - 0.15) / 2
+    d = dists[:, None]
+
+    low = np.full((forces.size, dists.size, heights.size), np.nan)
+    high = np.full_like(low, np.nan)
+    for i, f in enumerate(forces):
+        v_o = (2 * f) + f**2
+        coarse = arc_height(angles[None, :], v_o, d)
+        err = coarse[:, None, :] - aims[None, :, None]
+        up = (err[:, :, :-1] < 0) & (err[:, :, 1:] >= 0)
+        down = (err[:, :, :-1] >= 0) & (err[:, :, 1:] < 0)
+
+        # First rising crossing is the low arc, last falling crossing the high arc.
+        first_up = np.argmax(up, axis=2)
+        last_down = down.shape[2] - 1 - np.argmax(down[:, :, ::-1], axis=2)
+        for out, bracket, found, rising in ((low, first_up, up.any(axis=2), True),
+                                            (high, last_down, down.any(axis=2), False)):
+            lo = angles[bracket]
+            hi = angles[bracket + 1]
+            while np.any(hi - lo > tol):
+                mid = (lo + hi) / 2
+                move_lo = (arc_height(mid, v_o, d) < aims) == rising
+                lo = np.where(move_lo, mid, lo)
+                hi = np.where(move_lo, hi, mid)
+            out[i] = np.where(found, -1 * (lo + hi) / 2, np.nan)
+
+    return {'dists': dists, 'heights': heights, 'forces': forces,
+            'low': low, 'high': high, 'obx': np.array(obx), 'oby': np.array(oby)}
+
+
+def save_pitch_table(table, filename):
+    """
+    Save a table from build_pitch_table as a compressed .npz file.
+    """
+    np.savez_compressed(filename, **table)
+
+
+def load_pitch_table(filename):
+    """
+    Load a table saved with save_pitch_table.
+    """
+    with np.load(filename) as npz:
+        return {key: npz[key] for key in npz.files}
+
+
+def get_pitch_table(obx, oby, filename=None):
+    """
+    Load the pitch table for the given observation size, building and
+    saving it first if it doesn't exist yet.
+
+    input:
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player.
+
+        oby (int) - The observation distance from the player to the heighest
+                    y point.
+
+        filename (str) - Where the table is stored. Defaults to
+                         data/pitch_table_<obx>_<oby>.npz
+
+    output:
+        The table dict, see build_pitch_table.
+    """
+    if filename is None:
+        filename = 'data/pitch_table_{}_{}.npz'.format(obx, oby)
+    if os.path.exists(filename):
+        table = load_pitch_table(filename)
+        if table['obx'] == obx and table['oby'] == oby:
+            return table
+    print('Building pitch table for obx:', obx, 'oby:', oby)
+    table = build_pitch_table(obx, oby)
+    save_pitch_table(table, filename)
+    return table
+
+
+def table_pitch(table, dist, yt, f=1, obs=None):
+    """
+    Look up the pitch needed to hit a one block tall target by bilinear
+    interpolation of the pitch table. If the target is outside the table,
+    near the edge of what the arrow can reach, or the interpolated shot
+    is blocked by an obstacle, solve_pitch is used instead.
+
+    input:
+        table (dict) - A table from build_pitch_table or load_pitch_table.
+
+        dist (float) - The distance of the target from the player.
+
+        yt (float) - The height of the base of the target compared
+                     to the block the player is standing upon.
+
+        f (float) - The initial force of the arrow.
+
+        obs [[(dist, base), (dist, height)]]
+                - A list of lists, where each element list
+                  is a pair of points that draw a line segment
+                  that's the obstacle, or an array from obs_array.
+
+    output:
+        The pitch needed to hit the target, preferring the low arc, or None
+        if it can't be hit. Remember, above the horizon the pitch is negative.
+    """
+    f_i = np.flatnonzero(np.isclose(table['forces'], f))
+    dists, heights = table['dists'], table['heights']
+    d_i = np.searchsorted(dists, dist, side='right') - 1
+    h_i = np.searchsorted(heights, yt, side='right') - 1
+    if (f_i.size == 0 or d_i < 0 or h_i < 0 or
+            d_i + 1 >= dists.size or h_i + 1 >= heights.size):
+        return _exact_pitch(dist, yt, f, obs)
+
+    u = (dist - dists[d_i]) / (dists[d_i + 1] - dists[d_i])
+    w = (yt - heights[h_i]) / (heights[h_i + 1] - heights[h_i])
+    v_o = (2 * f) + f**2
+    for arc in ('low', 'high'):
+        cell = table[arc][f_i[0], d_i:d_i + 2, h_i:h_i + 2]
+        if np.isnan(cell).any():
+            continue
+        pitch = ((1 - u) * (1 - w) * cell[0, 0] + u * (1 - w) * cell[1, 0] +
+                 (1 - u) * w * cell[0, 1] + u * w * cell[1, 1])
+        # The low arc interpolates cleanly, steep high arcs are always checked.
+        if (arc == 'low' and (obs is None or len(obs) == 0)) or sim_shots(-1 * pitch, v_o, dist, yt, 1, obs) == 0:
+            return float(pitch)
+    return _exact_pitch(dist, yt, f, obs)
+
+
+def table_pow_pitch(table, dist, yt, obs=None):
+    """
+    The same as find_pow_pitch, but each force is looked up in the pitch
+    table with table_pitch instead of being simulated.
+
+    output:
+        A tuple of power and pitch (f, pitch), or (None, None) if the target
+        can't be hit with any force in the table.
+    """
+    for f in table['forces']:
+        pitch = table_pitch(table, dist, yt, f, obs)
+        if pitch is not None:
+            return f, pitch
+    return None, None
+
+
+def _exact_pitch(dist, yt, f, obs):
+    """
+    Fall back to solving the pitch directly, preferring the low arc.
+    """
+    low, high = solve_pitch(dist, yt, 1, f, obs)
+    return low if low is not None else high
@@ -0,0 +1,111 @@
+from __future__ import print_function
+
+import threading
+import time
+import traceback
+
+from util.runner import AgentRunner
+
+
+class ResultAggregator(object):
+    """
+    Collects the results of every agent in a pool. Agents run in their own
+    threads, so adding a result is locked.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = []
+        self.started = time.time()
+
+    def add(self, result):
+        """
+        Add a dict of one mission's results. It should have a 'port' and may
+        have 'shots' and 'hits'.
+        """
+        with self.lock:
+            self.results.append(dict(result, finished=time.time()))
+
+    def summary(self):
+        """
+        Totals over every mission so far.
+
+        output:
+            A dict of the number of 'missions', 'shots' and 'hits', the
+            'missions_per_min' of the whole pool and the missions of each
+            port in 'per_port'.
+        """
+        with self.lock:
+            results = list(self.results)
+        minutes = max(time.time() - self.started, 1e-9) / 60
+        per_port = {}
+        for result in results:
+            per_port[result['port']] = per_port.get(result['port'], 0) + 1
+        return {'missions': len(results),
+                'shots': sum(r.get('shots', 0) for r in results),
+                'hits': sum(r.get('hits', 0) for r in results),
+                'missions_per_min': len(results) / minutes,
+                'per_port': per_port}
+
+
+def client_pool(port, host='127.0.0.1'):
+    """
+    A Malmo ClientPool holding the single Minecraft client on port.
+    """
+    import MalmoPython
+
+    pool = MalmoPython.ClientPool()
+    pool.add(MalmoPython.ClientInfo(host, port))
+    return pool
+
+
+def run_pool(ports, run_agent, make_agent_host=None, make_client_pool=client_pool, host='127.0.0.1'):
+    """
+    Run one agent per Minecraft client, each in its own thread, and wait for
+    all of them to finish. Each agent gets an AgentRunner bound to its
+    client, so its missions only start on that client, and a shared
+    ResultAggregator to report to.
+
+    input:
+        ports (list) - The Minecraft client ports, e.g. [10000, 10001].
+
+        run_agent (function) - Called as run_agent(runner, aggregator, port)
+                               in the agent's thread to run its missions.
+
+        make_agent_host (function) - Makes a new agent host, defaults to
+                                     MalmoPython.AgentHost.
+
+        make_client_pool (function) - Makes the client pool of a port,
+                                      called as make_client_pool(port, host).
+
+        host (str) - The address of the clients.
+
+    output:
+        The ResultAggregator.
+    """
+    if make_agent_host is None:
+        import MalmoPython
+        make_agent_host = MalmoPython.AgentHost
+
+    aggregator = ResultAggregator()
+
+    def agent(port):
+        try:
+            runner = AgentRunner(make_agent_host(), client_pool=make_client_pool(port, host))
+            run_agent(runner, aggregator, port)
+        except SystemExit:
+            # The agent was told to stop, e.g. by util.headless's mission limit.
+            pass
+        except Exception:
+            print('Agent on port', port, 'stopped:')
+            traceback.print_exc()
+
+    threads = [threading.Thread(target=agent, args=(port,), name='agent-' + str(port))
+               for port in ports]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(1)
+    return aggregator
@@ -2,10 +2,12 @@
 
 import random
 
+from util.grid_observer_parse import get_heightmaps
 from util.grid_observer_parse import get_solid_y
 
 
-def find_con_spawn(con_x, con_z, con, obs_map, obx, oby, x, y, z, tries=10, center=True):
+def find_con_spawn(con_x, con_z, con, obs_map, obx, oby, x, y, z, tries=10, center=True,
+                   heights=None):
     """
     This method will find a random, safe, spot to spawn within
     the observable area of the player, if possible. It will also 
@@ -19,7 +21,8 @@ def find_con_spawn(con_x, con_z, con, obs_map, obx, oby, x, y, z, tries=10, cent
 
         con (int) - The amount to constrain the x and z difference.
 
-        obs_map (list) - map from grid['Map'] from a grid observation.
+        obs_map (list) - map from grid['Map'] from a grid observation,
+                         or a VoxelGrid from encode_grid.
 
         obx (int) - The distance to the edge of the x axis
                     grid from the player. Ex. If the player
@@ -40,25 +43,31 @@ def find_con_spawn(con_x, con_z, con, obs_map, obx, oby, x, y, z, tries=10, cent
 
         center (bool) - If the returned spawn should be centered on the block.
 
+        heights (tuple) - The heightmaps from get_heightmaps. They are computed
+                          once here if not provided and shared by every attempt.
+
     output:
         The x, y, z coordinates that can be used for the next spawn.
         If, after x tries (10 default) no spawn is found, return None.
     """ 
+    if heights is None:
+        heights = get_heightmaps(obs_map, obx, oby)
     nx = ny = nz = None
     while (nx is None or ny is None or nz is None or 
            abs(con_x-nx) > con or abs(con_z-nz) > con):
-        nx, ny, nz = find_rand_spawn(obs_map, obx, oby, x, y, z, tries)
+        nx, ny, nz = find_rand_spawn(obs_map, obx, oby, x, y, z, tries, heights=heights)
     print('Found new Spawn:', nx, ny, nz)
     return nx, ny, nz
 
 
-def find_rand_spawn(obs_map, obx, oby, x, y, z, tries=10, center=True):
+def find_rand_spawn(obs_map, obx, oby, x, y, z, tries=10, center=True, heights=None):
     """
     This method will find a random, safe, spot to spawn within
     the observable area of the player, if possible.
 
     input:
-        obs_map (list) - map from grid['Map'] from a grid observation.
+        obs_map (list) - map from grid['Map'] from a grid observation,
+                         or a VoxelGrid from encode_grid.
 
         obx (int) - The distance to the edge of the x axis
                     grid from the player. Ex. If the player
@@ -79,6 +88,7 @@ def find_rand_spawn(obs_map, obx, oby, x, y, z, tries=10, center=True):
 
         center (bool) - If the returned spawn should be centered on the block.
 
+        heights (tuple) - The heightmaps from get_heightmaps.
 
     output:
         The x, y, z coordinates that can be used for the next spawn.
@@ -91,7 +101,7 @@ def find_rand_spawn(obs_map, obx, oby, x, y, z, tries=10, center=True):
     az = rz+obx
     count = tries
     while count > 0:
-        ry = get_solid_y(obs_map, obx, oby, ax, az)
+        ry = get_solid_y(obs_map, obx, oby, ax, az, heights=heights)
         count -= 1
     if ry is None:
         return None, None, None
@@ -0,0 +1,87 @@
+
+import numpy as np
+
+from util.grid_observer_parse import VoxelGrid
+
+
+PALETTE = ['air', 'grass', 'dirt', 'stone', 'water', 'redstone_block', 'diamond_block']
+AIR, GRASS, DIRT, STONE, WATER, REDSTONE, DIAMOND = range(len(PALETTE))
+
+
+def random_grid(obx, oby, rng, targets=1, obstacles=(0, 10), hills=(0, 6)):
+    """
+    Make a random grid observation without Minecraft. The terrain is grass
+    over dirt and stone with smooth random hills and valleys, shallow water
+    in the low spots and stone pillars as obstacles. Each target is drawn the
+    way the mission XML draws them, a diamond block on top of two redstone
+    blocks. The player stands on the ground in the center of the grid.
+
+    input:
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player. Ex. If the player
+                    is in the center of a 51 meter cube
+                    the obx will be 25.
+
+        oby (int) - The observation distance from the player to the heighest
+                    y point.
+
+        rng (Generator) - A numpy random Generator, e.g.
+                          np.random.default_rng(seed). The same seed
+                          always gives the same grid.
+
+        targets (int) - How many diamond blocks to place.
+
+        obstacles (tuple) - The (min, max) number of stone pillars.
+
+        hills (tuple) - The (min, max) number of hills and valleys.
+
+    output:
+        A dict shaped like a parsed grid observation, with 'Map' as a
+        VoxelGrid and the player's 'XPos', 'YPos' and 'ZPos'.
+    """
+    s = 2*obx+1
+    sy = 2*oby+1
+    ax, az = np.meshgrid(np.arange(s), np.arange(s), indexing='xy')
+
+    # The player's feet are in the middle layer, so the ground is one below.
+    ground = np.full((s, s), oby - 1.0)
+    for _ in range(rng.integers(hills[0], hills[1] + 1)):
+        cx, cz = rng.uniform(0, s, 2)
+        width = rng.uniform(2, obx / 2 + 2)
+        ground += rng.uniform(-4, 6) * np.exp(-((ax-cx)**2 + (az-cz)**2) / (2 * width**2))
+    ground = np.clip(np.rint(ground), 1, sy - 5).astype(int)
+    ground[obx, obx] = oby - 1
+
+    ay = np.arange(sy)[:, None, None]
+    blocks = np.full((sy, s, s), AIR, dtype=np.uint8)
+    blocks[ay < ground - 2] = STONE
+    blocks[(ay >= ground - 2) & (ay < ground)] = DIRT
+    blocks[ay == ground] = GRASS
+    water = oby - 3
+    blocks[(ay > ground) & (ay <= water)] = WATER
+
+    for _ in range(rng.integers(obstacles[0], obstacles[1] + 1)):
+        x, z = _random_column(rng, obx)
+        top = min(ground[z, x] + rng.integers(1, 7), sy - 1)
+        blocks[ground[z, x] + 1:top + 1, z, x] = STONE
+
+    for _ in range(targets):
+        x, z = _random_column(rng, obx)
+        base = max(ground[z, x], water) + 1
+        blocks[base:base + 2, z, x] = REDSTONE
+        blocks[base + 2, z, x] = DIAMOND
+
+    return {'Map': VoxelGrid(blocks, list(PALETTE)),
+            'XPos': float(rng.integers(-1000, 1000)) + 0.5,
+            'YPos': float(rng.integers(5, 100)),
+            'ZPos': float(rng.integers(-1000, 1000)) + 0.5}
+
+
+def _random_column(rng, obx):
+    """
+    Pick a random absolute (x, z) column that isn't the player's.
+    """
+    while True:
+        x, z = rng.integers(0, 2*obx+1, 2)
+        if x != obx or z != obx:
+            return x, z
@@ -1,14 +1,19 @@
 
 
 import math
+import threading
 import numpy as np
 import skimage.draw as draw
 
 from matplotlib import collections as mc
 from matplotlib import pyplot as plt
 from util.data_collection import save_data
-from util.data_collection import save_labels
+from util.data_collection import save_record
+from util.grid_observer_parse import VoxelGrid
+from util.grid_observer_parse import block_ids
 from util.grid_observer_parse import get_block
+from util.grid_observer_parse import get_heightmaps
+from util.spans import span
 
 
 def find_yaw(xp, zp, xt, zt):
@@ -73,6 +78,45 @@ def check_hit_ob(x_arr, h_arr, dist, ob_b, ob_h=1, constrain=True):
     return intersect(p1_arr, p2_arr, p1_t, p2_t)
 
 
+def obs_array(obs):
+    """
+    Convert a list of obstacles into a numpy array that can be checked
+    against an arrow all at once. The half block that check_hit_obs adds
+    over the top of each obstacle is applied here, so it's only done once.
+    The rows are sorted by distance so obs_between can find the obstacles
+    an arrow step could reach with a binary search. Build this once per
+    target and share it between every angle and force that is tried.
+
+    input:
+        obs [[(dist, base), (dist, height)]]
+                - A list of lists, where each element list
+                  is a pair of points that draw a line segment
+                  that's the obstacle.
+
+    output:
+        A (N, 4) numpy array where each row is an obstacle as
+        (dist, base, dist, height + 0.5), sorted by dist. If obs
+        is already an array it's returned as is.
+    """
+    if isinstance(obs, np.ndarray):
+        return obs
+    ob_arr = np.empty((len(obs) if obs else 0, 4))
+    for i, ob in enumerate(obs or []):
+        ob_arr[i] = (ob[0][0], ob[0][1], ob[1][0], ob[1][1] + 0.5)
+    return ob_arr[np.argsort(ob_arr[:, 0], kind='stable')]
+
+
+def obs_between(ob_arr, x_1, x_2):
+    """
+    Get the obstacles from obs_array whose distance is between x_1 and x_2.
+    Every obstacle is a vertical line, so these are the only ones an arrow
+    moving from x_1 to x_2 could hit.
+    """
+    lo = np.searchsorted(ob_arr[:, 0], min(x_1, x_2), side='left')
+    hi = np.searchsorted(ob_arr[:, 0], max(x_1, x_2), side='right')
+    return ob_arr[lo:hi]
+
+
 def check_hit_obs(x_arr, h_arr, obs):
     """
     Check if the arrow has hit an obstacle in a list of obstacles. This 
@@ -93,7 +137,8 @@ def check_hit_obs(x_arr, h_arr, obs):
                   that's the obstacle. The first point is the 
                   distance of the obstacle and the base of the
                   obstacle. The second point is the distance of the
-                  obstacle and the objects maximum height.
+                  obstacle and the objects maximum height. This can
+                  also be an array from obs_array.
 
     output:
         A boolean that's True if the arrow intersects any of the obstacles
@@ -101,15 +146,58 @@ def check_hit_obs(x_arr, h_arr, obs):
     """
     if obs is None:
         return False
-    p1_arr = (x_arr[-2], h_arr[-2])
-    p2_arr = (x_arr[-1], h_arr[-1])
-    for ob in obs:
-        p1_ob = ob[0]
-        p2_ob = list(ob[1])
-        p2_ob[1] = p2_ob[1] + 0.5
-        if intersect(p1_arr, p2_arr, p1_ob, p2_ob):
-            return True
-    return False
+    near = obs_between(obs_array(obs), x_arr[-2], x_arr[-1])
+    return bool(intersect_arr(x_arr[-2], h_arr[-2], x_arr[-1], h_arr[-1],
+                              near[:, 0], near[:, 1], near[:, 2], near[:, 3]).any())
+
+
+def check_traj_obs(x_arr, h_arr, obs):
+    """
+    Check every step of an arrow's trajectory against every obstacle at
+    once. The same half block is added over the obstacles as check_hit_obs.
+
+    input:
+        x_arr (list) - The x position of the arrow from
+                       the player.
+
+        h_arr (list) - The height of the arrow compared
+                       to the block the player is standing
+                       upon.
+
+        obs [[(dist, base), (dist, height)]]
+                - A list of obstacles or an array from obs_array.
+
+    output:
+        A numpy array of booleans, one for each step of the trajectory
+        (len(x_arr) - 1), that's True where the step hits an obstacle.
+    """
+    x = np.asarray(x_arr, dtype=float)
+    h = np.asarray(h_arr, dtype=float)
+    if obs is None or len(obs) == 0:
+        return np.zeros(max(x.size - 1, 0), dtype=bool)
+    return _steps_hit_obs(x[:-1], h[:-1], x[1:], h[1:], obs_array(obs))
+
+
+def _steps_hit_obs(x_1, h_1, x_2, h_2, ob_arr):
+    """
+    Check many arrow steps, (x_1, h_1) to (x_2, h_2), against the sorted
+    obstacles from obs_array. Each step is only paired with the obstacles
+    between its two distances, found with a binary search, so the cost is
+    the number of steps times log N plus the number of nearby obstacles.
+
+    output:
+        A numpy array of booleans that's True where a step hits an obstacle.
+    """
+    lo = np.searchsorted(ob_arr[:, 0], np.minimum(x_1, x_2), side='left')
+    hi = np.searchsorted(ob_arr[:, 0], np.maximum(x_1, x_2), side='right')
+    counts = hi - lo
+    step = np.repeat(np.arange(counts.size), counts)
+    ob_i = np.arange(step.size) - np.repeat(np.cumsum(counts) - counts, counts) + lo[step]
+    pair_hit = intersect_arr(x_1[step], h_1[step], x_2[step], h_2[step],
+                             ob_arr[ob_i, 0], ob_arr[ob_i, 1], ob_arr[ob_i, 2], ob_arr[ob_i, 3])
+    hit = np.zeros(counts.size, dtype=bool)
+    hit[step[pair_hit]] = True
+    return hit
 
 
 def save_trajectory_info(x_arr, h_arr, t_d, t_b, t_h, obs=None, view_x=25, view_y=10):
@@ -148,6 +236,8 @@ def save_trajectory_info(x_arr, h_arr, t_d, t_b, t_h, obs=None, view_x=25, view_
     fig, ax = plt.subplots()
     ax.plot(x_control, y_control, linewidth=2, label='Player Standing')
     ax.plot(x_arr, h_arr, linewidth=2, color='b', label='Arrow Trajectory')
+    if isinstance(obs, np.ndarray):
+        obs = obs.reshape(-1, 2, 2)
     if obs is not None:
             obs_col = mc.LineCollection(obs, color='r', label='Obstacles')
             ax.add_collection(obs_col)
@@ -207,19 +297,228 @@ def sim_shot(angle, v_o, t_d, t_b, t_h, obs=None, image=False):
         v_x.append(v_x[-1] * .99)
         v_h.append(v_h[-1] * .99 - .05)
 
-        if check_hit_obs(x_arr, h_arr, obs):
-            break
-
-        if check_hit_ob(x_arr, h_arr, t_d, t_b, t_h): 
-            if image:
-                save_trajectory_info(x_arr, h_arr, t_d, t_b, t_h, obs=obs)
-            return 0
+    # Check the whole flight at once. An obstacle in the same step as the
+    # target still blocks it, like checking the obstacles first each tick.
+    end = len(x_arr) - 1
+    blocked = np.flatnonzero(check_traj_obs(x_arr, h_arr, obs))
+    if blocked.size:
+        end = blocked[0] + 1
+    x = np.asarray(x_arr[:end + 1])
+    h = np.asarray(h_arr[:end + 1])
+    on_target = np.flatnonzero(intersect_arr(x[:-1], h[:-1], x[1:], h[1:],
+                                             t_d, t_b + 0.25, t_d, t_b + t_h - 0.15))
+    if on_target.size and (not blocked.size or on_target[0] < blocked[0]):
+        if image:
+            step = on_target[0] + 2
+            save_trajectory_info(x_arr[:step], h_arr[:step], t_d, t_b, t_h, obs=obs)
+        return 0
 
     t_c = (t_b + t_h) / 2
-    return math.sqrt((x_arr[-1] - t_d)**2 + (h_arr[-1] - t_c)**2)
+    return math.sqrt((x_arr[end] - t_d)**2 + (h_arr[end] - t_c)**2)
+
+
+def sim_shots(angles, v_os, t_ds, t_bs, t_hs=1, obs=None):
+    """
+    Simulate a batch of arrow shots at once. This uses the same drag (0.99)
+    and gravity (0.05) as sim_shot, but every trajectory is advanced together
+    with numpy arrays instead of one arrow and one tick at a time. All of the
+    inputs are broadcast against each other, so a single target can be tested
+    against many angles or forces (or the other way around).
+
+    input:
+        angles (array) - The angles the arrows should be shot. Measuring 0 from
+                         the horizon and positive in the intuitive 'up' direction.
 
+        v_os (array) - Initial velocities.
 
-def find_pitch(t_d, t_b, t_h=1, f=1, obs=None, image=False):
+        t_ds (array) - Distances of the targets relative to the player.
+
+        t_bs (array) - The bases of the targets relative to the player's y position.
+
+        t_hs (array) - The heights of the targets from the base of the target.
+
+        obs [[(dist, base), (dist, height)]]
+                - A list of lists, where each element list
+                  is a pair of points that draw a line segment
+                  that's the obstacle. These obstacles are shared
+                  by every shot in the batch.
+
+    output:
+        A numpy array, shaped like the broadcast inputs, with the distance from
+        the center of the target to each arrow's final position. Just like
+        sim_shot a hit is returned as 0.
+    """
+    arrs = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in
+                                 (angles, v_os, t_ds, t_bs, t_hs)])
+    shape = arrs[0].shape
+    angles, v_os, t_ds, t_bs, t_hs = [a.ravel() for a in arrs]
+
+    x = np.zeros(angles.size)
+    h = np.full(angles.size, 1.62)
+    v_x = v_os * np.cos(np.radians(angles))
+    v_h = v_os * np.sin(np.radians(angles))
+
+    ob_arr = obs_array(obs)
+
+    hit = np.zeros(angles.size, dtype=bool)
+    active = (x < t_ds) & (v_x > .01)
+    while active.any():
+        idx = np.flatnonzero(active)
+        x0, h0 = x[idx], h[idx]
+        x1, h1 = x0 + v_x[idx], h0 + v_h[idx]
+        x[idx], h[idx] = x1, h1
+        v_x[idx] *= .99
+        v_h[idx] = v_h[idx] * .99 - .05
+
+        blocked = np.zeros(idx.size, dtype=bool)
+        if len(ob_arr):
+            blocked = _steps_hit_obs(x0, h0, x1, h1, ob_arr)
+        t_d = t_ds[idx]
+        on_target = ~blocked & intersect_arr(x0, h0, x1, h1,
+                                             t_d, t_bs[idx] + 0.25,
+                                             t_d, t_bs[idx] + t_hs[idx] - 0.15)
+        hit[idx[on_target]] = True
+        active[idx] = ~blocked & ~on_target & (x1 < t_d) & (v_x[idx] > .01)
+
+    t_c = (t_bs + t_hs) / 2
+    miss = np.sqrt((x - t_ds)**2 + (h - t_c)**2)
+    miss[hit] = 0
+    return miss.reshape(shape)
+
+
+def arc_height(angles, v_o, t_d):
+    """
+    Determine the height of an arrow when it reaches a given distance
+    without stepping through the simulation. The drag recurrence is a
+    geometric series, so after n ticks the arrow is at
+
+        x_n = v_x * 100 * (1 - 0.99**n)
+        h_n = 1.62 + (v_h + 5) * 100 * (1 - 0.99**n) - 5 * n
+
+    The tick where the arrow passes t_d is solved for directly and the
+    height is interpolated along that tick's segment, which is the same
+    straight line sim_shot checks against the target.
+
+    input:
+        angles (array) - The angles the arrow should be shot. Measuring 0 from
+                         the horizon and positive in the intuitive 'up' direction.
+
+        v_o (float) - Initial velocity.
+
+        t_d (float) - Distance of the target relative to the player.
+
+    output:
+        A numpy array of the arrow heights at t_d. The height is nan for
+        any angle where the arrow stops before reaching t_d.
+    """
+    rad = np.radians(np.asarray(angles, dtype=float))
+    v_x = v_o * np.cos(rad)
+    v_h = v_o * np.sin(rad)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.floor(np.log1p(-t_d / (100 * v_x)) / math.log(.99))
+        s_0 = 100 * (1 - .99**k)
+        s_1 = 100 * (1 - .99**(k + 1))
+        h_0 = 1.62 + (v_h + 5) * s_0 - 5 * k
+        h_1 = 1.62 + (v_h + 5) * s_1 - 5 * (k + 1)
+        h = h_0 + (h_1 - h_0) * (t_d / v_x - s_0) / (s_1 - s_0)
+        return np.where(v_x * .99**k > .01, h, np.nan)
+
+
+def solve_pitch(t_d, t_b, t_h=1, f=1, obs=None, tol=1e-3):
+    """
+    Find both the low arc and the high arc pitch needed to hit a provided
+    target. Instead of simulating every integer angle, arc_height is used to
+    bracket the angles where the arrow passes through the target and each
+    bracket is then refined with bisection. A handful of angles across the
+    feasible interval are checked against the obstacles with sim_shots and
+    the clear one closest to the center of the target is returned.
+
+    input:
+        t_d (float) - The distance of the target from the player.
+
+        t_b (float) - The height of the base of the target compared
+                      to the block the player is standing upon.
+                      Essentially the y coordinate relative to the
+                      player.
+
+        t_h (float) - The height of the target from the base of the target.
+
+        f (float) - The initial force of the arrow. This is
+                    calculated by the amount of time the bow
+                    should be drawn between 0 and 1. Where 1
+                    is one second of draw time.
+
+        obs [[(dist, base), (dist, height)]]
+                - A list of lists, where each element list
+                  is a pair of points that draw a line segment
+                  that's the obstacle. The first point is the 
+                  distance of the obstacle and the base of the
+                  obstacle. The second point is the distance of the
+                  obstacle and its height from the base.
+
+        tol (float) - How precise, in degrees, the returned pitches should be.
+
+    output:
+        A tuple of (low, high) pitches. Either is None if that arc can't
+        reach the target or is blocked by an obstacle. Remember, above the
+        horizon the angle for the pitch is negative.
+    """
+    v_o = (2 * f) + f**2
+    angles = np.arange(-89, 90.5, 0.5)
+    heights = arc_height(angles, v_o, t_d)
+
+    # Same window check_hit_ob uses, pulled in a little so bisection
+    # rounding doesn't land right on the edge.
+    bottom, top = t_b + 0.25, t_b + t_h - 0.15
+    aim = (bottom + top) / 2
+    spread = (top - bottom) * 0.4
+    roots = [_arc_roots(angles, heights, v_o, t_d, level, tol)
+             for level in (aim, aim - spread, aim + spread)]
+
+    pitches = []
+    for arc in range(2):
+        found = [r[arc] for r in roots if r[arc] is not None]
+        if not found:
+            pitches.append(None)
+            continue
+        center = found[0]
+        if obs is None or len(obs) == 0:
+            pitches.append(-1 * float(center))
+            continue
+        trials = np.linspace(min(found), max(found), 9)
+        trials = np.concatenate(([center], trials[np.argsort(np.abs(trials - center))]))
+        clear = sim_shots(trials, v_o, t_d, t_b, t_h, obs) == 0
+        pitches.append(-1 * float(trials[np.argmax(clear)]) if clear.any() else None)
+    return pitches[0], pitches[1]
+
+
+def _arc_roots(angles, heights, v_o, t_d, level, tol):
+    """
+    Bisect the low arc and high arc angles where the arrow is at the
+    given level when it reaches t_d. The coarse heights from arc_height
+    over angles are used to bracket each root. Either root is None when
+    the arc never crosses the level.
+    """
+    err = heights - level
+    up = np.flatnonzero((err[:-1] < 0) & (err[1:] >= 0))
+    down = np.flatnonzero((err[:-1] >= 0) & (err[1:] < 0))
+    roots = []
+    for rising, bracket in ((True, up[:1]), (False, down[-1:])):
+        if bracket.size == 0:
+            roots.append(None)
+            continue
+        lo, hi = angles[bracket[0]], angles[bracket[0] + 1]
+        while hi - lo > tol:
+            mid = (lo + hi) / 2
+            if (arc_height(mid, v_o, t_d) < level) == rising:
+                lo = mid
+            else:
+                hi = mid
+        roots.append((lo + hi) / 2)
+    return roots
+
+
+def find_pitch(t_d, t_b, t_h=1, f=1, obs=None, image=False, mode='sweep'):
     """
     Find the pitch needed to hit a provided target. Remember,
     the arrow is shot from 1.62 meters from the y coordinate
@@ -251,22 +550,42 @@ def find_pitch(t_d, t_b, t_h=1, f=1, obs=None, image=False):
         image (bool) - If graphs should be created and saved based on 
                        arrow trajectory.
 
+        mode (str) - 'sweep' tries every integer angle from -89 to 90.
+                     'bisect' uses solve_pitch for a sub-degree answer,
+                     preferring the low arc over the high arc.
+
     output:
         The angle of the bow needed to hit the target via the given
         parameters. Remember, above the horizon the angle for the pitch
         is negative.
     """
-    angle = -90
     v_o = (2 * f) + f**2
-    while angle < 90:
-        angle += 1
-        dist = sim_shot(angle, v_o, t_d, t_b, t_h, obs, image=image)
-        if dist == 0:
-            return -1 * angle
-    return None
+    if mode == 'bisect':
+        low, high = solve_pitch(t_d, t_b, t_h, f, obs)
+        pitch = low if low is not None else high
+        if image and pitch is not None:
+            sim_shot(-1 * pitch, v_o, t_d, t_b, t_h, obs, image=image)
+        return pitch
+    if mode != 'sweep':
+        raise ValueError("Unknown pitch solver mode: " + str(mode))
 
-
-def find_pow_pitch(dist, yt, obs=None, image=False):
+    if image:
+        angle = -90
+        while angle < 90:
+            angle += 1
+            dist = sim_shot(angle, v_o, t_d, t_b, t_h, obs, image=image)
+            if dist == 0:
+                return -1 * angle
+        return None
+
+    angles = np.arange(-89, 91)
+    hits = np.flatnonzero(sim_shots(angles, v_o, t_d, t_b, t_h, obs) == 0)
+    if hits.size == 0:
+        return None
+    return -1 * int(angles[hits[0]])
+
+
+def find_pow_pitch(dist, yt, obs=None, image=False, mode='sweep'):
     """
     Find the power (f) and pitch angle needed to hit a target given
     the provided parameters.
@@ -287,6 +606,8 @@ def find_pow_pitch(dist, yt, obs=None, image=False):
                   obstacle. The second point is the distance of the
                   obstacle and its height from the base.
 
+        mode (str) - The find_pitch solver to use, 'sweep' or 'bisect'.
+
     output:
         A tuple of power and pitch (f, pitch). The power (f) is the time 
         between 0 and 1 seconds to draw the bow to hit the target. The pitch
@@ -294,10 +615,19 @@ def find_pow_pitch(dist, yt, obs=None, image=False):
         Minecraft the angle above the horizon is negative.
     """
     f_test = np.arange(1, 0, -0.1)
-    for f in f_test:
-        pitch = find_pitch(dist, yt, f=f, obs=obs, image=image)
-        if pitch is not None:
-            return f, pitch
+    if image or mode != 'sweep':
+        for f in f_test:
+            pitch = find_pitch(dist, yt, f=f, obs=obs, image=image, mode=mode)
+            if pitch is not None:
+                return f, pitch
+        return None, None
+
+    angles = np.arange(-89, 91)
+    v_o = (2 * f_test) + f_test**2
+    hits = sim_shots(angles[None, :], v_o[:, None], dist, yt, 1, obs) == 0
+    for i in range(len(f_test)):
+        if hits[i].any():
+            return f_test[i], -1 * int(angles[np.argmax(hits[i])])
     return None, None
 
 
@@ -312,7 +642,8 @@ def find_target_coords(obs_map, block, obx, oby, obz, apx, apy, apz, center=True
 
     inputs:
         obs_map (list) - map from grid['Map'] from a grid
-                         observation.
+                         observation, or a VoxelGrid from
+                         encode_grid.
 
         block (str) - name of the block to target
 
@@ -342,10 +673,16 @@ def find_target_coords(obs_map, block, obx, oby, obz, apx, apy, apz, center=True
     """
     if obx != obz:
         raise ValueError('Observed Map Area must be square!')
-    try:
-        pos = obs_map.index(block, 0)
-    except:
-        return (None, None, None)
+    if isinstance(obs_map, VoxelGrid):
+        found = np.flatnonzero(np.isin(obs_map.blocks.ravel(), block_ids(obs_map, [block])))
+        if found.size == 0:
+            return (None, None, None)
+        pos = int(found[0])
+    else:
+        try:
+            pos = obs_map.index(block, 0)
+        except:
+            return (None, None, None)
 
     sx = obx*2+1
     sy = oby*2+1
@@ -364,6 +701,82 @@ def find_target_coords(obs_map, block, obx, oby, obz, apx, apy, apz, center=True
     return (tx-rpx-apx%1, ty-rpy-apy%1, tz-rpz-apz%1)
 
 
+# The positions of the last block searched for by find_targets_coords, so
+# asking again about the same observation doesn't scan the map again. Each
+# thread has its own, so agents in a pool don't read each other's map.
+_target_cache = threading.local()
+
+
+def clear_target_cache():
+    """
+    Forget the thread's cached target positions, so the next call to
+    find_targets_coords scans the map again.
+    """
+    _target_cache.map = None
+
+
+def find_targets_coords(obs_map, block, obx, oby, obz, apx, apy, apz, center=True):
+    """
+    The same as find_target_coords, but every matching block is found in
+    one vectorized pass over the map instead of only the first one. The
+    positions are cached for each thread's most recent observation and
+    block.
+
+    inputs:
+        obs_map (list) - map from grid['Map'] from a grid
+                         observation, or a VoxelGrid from
+                         encode_grid.
+
+        block (str) - name of the block to target
+
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player.
+
+        oby (int) - The distance to the edge of the y axis
+                    grid from the player.
+
+        obz (int) - The distance to the edge of the z axis
+                    grid from the player.
+
+        apx (int) - Absolute x position of the player in Minecraft.
+
+        apy (int) - Absolute x position of the player in Minecraft.
+
+        apz (int) - Absolute x position of the player in Minecraft.
+
+        center (bool) - If the targets should be centered in
+                        their blocks.
+
+    return:
+        A list of (x, y, z) tuples with the coordinates of every target
+        relative to the player, nearest first. The list is empty if there
+        are no targets.
+    """
+    if obx != obz:
+        raise ValueError('Observed Map Area must be square!')
+    if getattr(_target_cache, 'map', None) is obs_map and getattr(_target_cache, 'block', None) == block:
+        pos = _target_cache.pos
+    else:
+        if isinstance(obs_map, VoxelGrid):
+            pos = np.flatnonzero(np.isin(obs_map.blocks.ravel(), block_ids(obs_map, [block])))
+        else:
+            pos = np.flatnonzero(np.asarray(obs_map) == block)
+        _target_cache.map, _target_cache.block, _target_cache.pos = obs_map, block, pos
+
+    sx = obx*2+1
+    sy = oby*2+1
+    sz = obz*2+1
+    tx = pos % (sx*sz) % sx + (0.5 if center else 0)
+    ty = pos // (sx*sz)
+    tz = pos % (sx*sz) // sz + (0.5 if center else 0)
+    tx = tx - sx//2 - apx%1
+    ty = ty - sy//2 - apy%1
+    tz = tz - sz//2 - apz%1
+
+    order = np.argsort(tx**2 + ty**2 + tz**2, kind='stable')
+    return list(zip(tx[order].tolist(), ty[order].tolist(), tz[order].tolist()))
+
+
 def obstacle_coords(obx, obz, tx, tz, image=False):
     """
     Determine the coordinates of all obstacles between the
@@ -417,13 +830,14 @@ def obstacle_coords(obx, obz, tx, tz, image=False):
     return (obs[1], obs[0])
 
 
-def get_obs(obs_map, obs_coords, oby, obx, target, image=False):
+def get_obs(obs_map, obs_coords, oby, obx, target, image=False, heights=None):
     """
     Determine the height and distance of all obstacles from the player.
 
     input:
         obs_map (list) - map from grid['Map'] from a grid
-                         observation.
+                         observation, or a VoxelGrid from
+                         encode_grid.
 
         obs_coords ([[list x] [list z]]) - A list of two lists
                                            where the first is the x
@@ -443,6 +857,9 @@ def get_obs(obs_map, obs_coords, oby, obx, target, image=False):
         image (bool) - Boolean if graphs should be created and saved
                        of the obstacles.
 
+        heights (tuple) - The heightmaps from get_heightmaps. If given the
+                          top of each column is looked up instead of scanned.
+
     output:
         obs [[(dist, base), (dist, height)]]
                 - A list of lists, where each element list
@@ -453,17 +870,25 @@ def get_obs(obs_map, obs_coords, oby, obx, target, image=False):
                   obstacle and its height from the base.
     """
     obs = []
-    for i in range(len(obs_coords[0])):
-        x = obs_coords[0][i]
-        z = obs_coords[1][i]
-        for y in range(2*oby, 0, -1):
-            block = get_block(obs_map, 2*obx+1, x, y, z)
-            if block != 'air':  
-                if block == target:
-                    break  
-                dist = math.sqrt((x-obx)**2 + (z-obx)**2)
-                obs.append([(dist, -oby), (dist, y-oby+1)])
-                break
+    if heights is not None:
+        for x, z in zip(obs_coords[0], obs_coords[1]):
+            y = heights[0][x, z]
+            if np.isnan(y) or get_block(obs_map, 2*obx+1, x, int(y)+oby-1, z) == target:
+                continue
+            dist = math.sqrt((x-obx)**2 + (z-obx)**2)
+            obs.append([(dist, -oby), (dist, int(y))])
+    else:
+        for i in range(len(obs_coords[0])):
+            x = obs_coords[0][i]
+            z = obs_coords[1][i]
+            for y in range(2*oby, 0, -1):
+                block = get_block(obs_map, 2*obx+1, x, y, z)
+                if block != 'air':  
+                    if block == target:
+                        break  
+                    dist = math.sqrt((x-obx)**2 + (z-obx)**2)
+                    obs.append([(dist, -oby), (dist, y-oby+1)])
+                    break
     if image:
         x_control = range(-1, int(math.sqrt(obx**2+obx**2))+1)
         y_control = [0 for x in x_control]
@@ -481,11 +906,67 @@ def get_obs(obs_map, obs_coords, oby, obx, target, image=False):
     return obs
 
 
-def pitch_yaw_force(block, grid, obx, oby, obz, target, record=False, image=False):
+def target_yaw_obs(block, grid, obx, oby, obz, target, record=False, image=False, heights=None,
+                   verbose=True):
+    """
+    Determine where the first matching block is, the yaw to face it and
+    the obstacles in the way, without solving the pitch and force. This
+    is the first half of pitch_yaw_force.
+
+    input:
+        block (str) - The Minecraft id of the block to target.
+
+        grid (dict) - The unpaked json response from a grid observation.
+
+        obx (int) - The distance to the edge of the x axis
+                    grid from the player.
+
+        oby (int) - The distance to the edge of the y axis
+                    grid from the player.
+
+        obz (int) - The distance to the edge of the z axis
+                    grid from the player.
+
+        target (str) - The minecraft block id of our target block.
+
+        record (bool) - A flag if the data (tx, ty, tz, obs) should be recorded.
+
+        image (bool) - If graphs of the obstacles should be saved.
+
+        heights (tuple) - The heightmaps of grid['Map'] from get_heightmaps.
+
+        verbose (bool) - If progress should be printed.
+
+    output:
+        A tuple of (ty, tx, tz, dist, yaw, obs) where dist is the horizontal
+        distance to the target and obs is the list from get_obs. Everything
+        is None if the block isn't in the grid.
+    """
+    px, py, pz = grid['XPos'], grid['YPos'], grid['ZPos']
+    with span('targets'):
+        tx, ty, tz = find_target_coords(grid['Map'], block, obx, oby, obz, px, py, pz)
+    if verbose:
+        print('Tx:', tx, 'Ty:', ty, 'Tz:', tz)
+    if tx is None or ty is None or tz is None:
+        return None, None, None, None, None, None
+
+    with span('obstacles'):
+        obs_coords = obstacle_coords(obx, obz, tx, tz, image=image)
+        obs = get_obs(grid['Map'], obs_coords, oby, obx, target, image=image, heights=heights)
+    yaw = find_yaw(0, 0, tx, tz)
+    dist = math.sqrt(tx**2 + tz**2)
+
+    if record:
+        save_data(tx, ty, tz, obs)
+    return ty, tx, tz, dist, yaw, obs
+
+
+def pitch_yaw_force(block, grid, obx, oby, obz, target, record=False, image=False, table=None,
+                    heights=None, all_targets=False):
     """
     Determine the pitch, yaw, and force needed to hit a specified block.
     The first block found while searching the grid_map will become the
-    target.
+    target, unless all_targets is set.
 
     input:
         block (str) - The Minecraft id of the block to target.
@@ -508,32 +989,64 @@ def pitch_yaw_force(block, grid, obx, oby, obz, target, record=False, image=Fals
         record (bool) - A flag if the data (tx, ty, tz, obs) and labels
                         (pitch, yaw, force) should be recorded.
 
+        table (dict) - A pitch table from util.pitch_table. If provided the
+                       pitch and force are looked up in it instead of being
+                       simulated.
+
+        heights (tuple) - The heightmaps of grid['Map'] from get_heightmaps.
+                          They are computed here if not provided.
+
+        all_targets (bool) - If every matching block should be tried,
+                             nearest first, until one can be hit.
+
     output:
         A tuple of (pitch, yaw, force) needed to hit the first found 
-        block in the obs_map.
+        block in the obs_map, or the nearest hittable one if all_targets
+        is set.
 
     """
     print('Getting Target Coords')
     px, py, pz = grid['XPos'], grid['YPos'], grid['ZPos']
-    tx, ty, tz = find_target_coords(grid['Map'], block, obx, oby, obz, px, py, pz)
-    print('Tx:', tx, 'Ty:', ty, 'Tz:', tz)
-
-    if tx is None or ty is None or tz is None:
+    with span('targets'):
+        if all_targets:
+            targets = find_targets_coords(grid['Map'], block, obx, oby, obz, px, py, pz)
+        else:
+            targets = [find_target_coords(grid['Map'], block, obx, oby, obz, px, py, pz)]
+            if None in targets[0]:
+                print('Tx:', None, 'Ty:', None, 'Tz:', None)
+                targets = []
+
+    if not targets:
         return None, None, None
-
-    print('Determining Obstacles')
-    obs_coords = obstacle_coords(obx, obz, tx, tz, image=image)
-    obs = get_obs(grid['Map'], obs_coords, oby, obx, target, image=image)
-
-    print('Determining Power, Yaw and Pitch')
-    yaw = find_yaw(0, 0, tx, tz)
-    dist = math.sqrt(tx**2 + tz**2)
-    f, pitch = find_pow_pitch(dist, ty, obs, image=image)
-    print('pitch: ', pitch, 'yaw:', yaw, 'f:', f)
+    if heights is None:
+        with span('heightmaps'):
+            heights = get_heightmaps(grid['Map'], obx, oby)
+
+    for tx, ty, tz in targets:
+        print('Tx:', tx, 'Ty:', ty, 'Tz:', tz)
+
+        print('Determining Obstacles')
+        with span('obstacles'):
+            obs_coords = obstacle_coords(obx, obz, tx, tz, image=image)
+            obs = get_obs(grid['Map'], obs_coords, oby, obx, target, image=image, heights=heights)
+
+        print('Determining Power, Yaw and Pitch')
+        yaw = find_yaw(0, 0, tx, tz)
+        dist = math.sqrt(tx**2 + tz**2)
+        ob_arr = obs_array(obs)
+        with span('pitch_solve'):
+            if table is not None:
+                # pitch_table builds on this module, so it can't be imported at the top.
+                from util.pitch_table import table_pow_pitch
+                f, pitch = table_pow_pitch(table, dist, ty, ob_arr)
+            else:
+                f, pitch = find_pow_pitch(dist, ty, ob_arr, image=image)
+        print('pitch: ', pitch, 'yaw:', yaw, 'f:', f)
+        if pitch is not None:
+            break
 
     if record:
-        save_data(tx, ty, tz, obs)
-        save_labels(pitch, yaw, f)
+        save_record(tx, ty, tz, obs, pitch, yaw, f)
 
     return pitch, yaw, f
 
@@ -557,3 +1070,20 @@ def ccw(A,B,C):
     questions/3838329/how-can-i-check-if-two-segments-intersect
     """
     return (C[1]-A[1]) * (B[0]-A[0]) > (B[1]-A[1]) * (C[0]-A[0])
+
+
+def intersect_arr(ax, ay, bx, by, cx, cy, dx, dy):
+    """
+    The same test as intersect, but for numpy arrays of coordinates
+    where segment AB is checked against segment CD element-wise. The
+    arrays are broadcast so one segment can be checked against many.
+    """
+    return ((ccw_arr(ax, ay, cx, cy, dx, dy) != ccw_arr(bx, by, cx, cy, dx, dy)) &
+            (ccw_arr(ax, ay, bx, by, cx, cy) != ccw_arr(ax, ay, bx, by, dx, dy)))
+
+
+def ccw_arr(ax, ay, bx, by, cx, cy):
+    """
+    The same test as ccw, but for numpy arrays of coordinates.
+    """
+    return (cy-ay) * (bx-ax) > (by-ay) * (cx-ax)
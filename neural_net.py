@@ -8,45 +8,40 @@ from sklearn.neural_network import MLPRegressor
 from sklearn.model_selection import GridSearchCV, PredefinedSplit
 from sklearn.model_selection import ParameterGrid
 import pandas as pd
+import os
+import sys
+from Denis.util.features import max_height_ragged
+from Denis.util.features import read_max_height
+from Denis.util.features import target_distance
+from Denis.util.search import search
+from Zach.Missions.util.data_collection import read_dataset
 
 if __name__ == '__main__':
-    datafile = open('1kdata/1k_data.txt', 'r')
-    samples = []
-    for line in datafile:
-        samples.append([float(i) for i in line.split()])
-    del(samples[85])
+    if os.path.isdir('1kdata/1k_dataset'):
+        # The text files converted with Zach's util.data_collection with
+        # --drop 85, so the rows line up the same as below.
+        dataset = read_dataset('1kdata/1k_dataset')
+        targets = dataset['targets']
+        lengths = 3 + 2*np.diff(dataset['offsets'])
+        obs_dist, obs_height = max_height_ragged(dataset['obstacles'], dataset['offsets'])
+        pitch = np.asarray(dataset['labels'])
+    else:
+        targets, lengths, obs_dist, obs_height = read_max_height('1kdata/1k_data.txt')
+        targets, lengths, obs_dist, obs_height = [np.delete(a, 85, axis=0) for a in
+                                                  (targets, lengths, obs_dist, obs_height)]
 
-    labelfile = open('1kdata/1k_labels.txt', 'r')
-    pitch = []
-    for line in labelfile:
-        pitch.append([float(i) for i in line.split()])
+        labelfile = open('1kdata/1k_labels.txt', 'r')
+        pitch = []
+        for line in labelfile:
+            pitch.append([float(i) for i in line.split()])
 
-    indicesToKeep = []
-    #del(pitch[85])
-    for i in range(0, len(pitch), 1):
-        if pitch[i][2] == 1:
-            if len(samples[i]) > 3:
-                indicesToKeep.append(i)
+        pitch = np.asarray(pitch)
+    keep = (pitch[:, 2] == 1) & (lengths > 3)
 
-    X = []
-    y = []
-    for i in indicesToKeep:
-        X.append(samples[i])
-        y.append(pitch[i][0])
-
-    #print(len(max(X, key=len)))
-    for i in range(0, len(X), 1):
-        '''if len(X[i]) < 143:
-            length = 143 - len(X[i])
-            zeros = [0] * length
-            X[i].extend(zeros)'''
-        obs_height = -200
-        obs_dist = 0
-        for j in range(3, len(X[i]), 2):
-            if obs_height < X[i][j+1]:
-                obs_height = X[i][j+1]
-                obs_dist = X[i][j]
-        X[i] = [X[i][1], np.sqrt(((X[i][0])**2)+((X[i][2])**2)), obs_dist, obs_height]
+    X = np.column_stack((targets[keep, 1],
+                         target_distance(targets[keep, 0], targets[keep, 2]),
+                         obs_dist[keep], obs_height[keep]))
+    y = pitch[keep, 0]
 
     splitsize = int(len(X)*0.9)
     X_test = np.asarray(X[splitsize:])
@@ -57,6 +52,30 @@ if __name__ == '__main__':
     X = np.asarray(X)
     y = np.asarray(y)
 
+    # python neural_net.py [grid|random|halving] runs the hyperparameter search
+    # for view_df.py. Finished fits are cached in grid_search_cache, so an
+    # interrupted or extended search only runs the new ones.
+    if len(sys.argv) > 1 and sys.argv[1] in ('grid', 'random', 'halving'):
+        tuples = []
+        for i in range(1,10,1):
+            tuples.append((i,))
+            for j in range(1, 10, 1):
+                tuples.append((i,j))
+        alphas = []
+        for i in np.arange(-2, 3, 0.2):
+            alphas.append(10**i)
+
+        param_grid = {
+            'hidden_layer_sizes': tuples,
+            'alpha': alphas
+        }
+
+        df = search(MLPRegressor(activation='logistic', tol=1e-6, solver='lbfgs', random_state=1),
+                    param_grid, X, y, method=sys.argv[1], n_iter=100, cache_dir='grid_search_cache')
+        df.to_pickle('grid_search_results.pkl')
+        print(df[['params', 'mean_test_score', 'n_resources']].head(10))
+        sys.exit(0)
+
     #print(X_train)
     #print(X_test)
     #X_train = np.delete(X_train,np.argmax(y_train),0)
@@ -87,32 +106,6 @@ if __name__ == '__main__':
         print(rlf.score(X_test, y_test))
 
     
-    tuples = []
-    for i in range(1,10,1):
-        tuples.append((i,))
-        for j in range(1, 10, 1):
-            tuples.append((i,j))
-    alphas = []
-    for i in np.arange(-2, 3, 0.2):
-        alphas.append(10**i)
-
-    #test_fold = [-1] * len(X_train) + [0] * len(X_test)  # 0 corresponds to test, -1 to train
-    #predefined_split = PredefinedSplit(test_fold=test_fold)
-    param_grid = [{
-        'hidden_layer_sizes': tuples,
-        'alpha': alphas
-    }]
-
-    gs = GridSearchCV(estimator=MLPRegressor(activation='logistic', tol=1e-6, solver='lbfgs', random_state=1), param_grid=param_grid)
-    X = np.asarray(X)
-    y = np.asarray(y)
-    #print(X)
-    #print(y)
-    gs.fit(X, y)
-
-    df = pd.DataFrame(gs.cv_results_)
-    df.to_pickle('grid_search_results.pkl')
-    
     '''
     rlf = MLPRegressor(solver='lbfgs', hidden_layer_sizes=(100,100), activation='logistic', random_state=1, alpha=10**(1.9130434782608696), tol=1e-6)
     #rlf = MLPRegressor(solver='lbfgs', hidden_layer_sizes=(9, 8), activation='logistic', random_state=1, alpha=0.0630957344480193, tol=1e-6)